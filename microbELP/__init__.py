@@ -1,9 +1,18 @@
 from microbELP.microbELP import microbELP
 from microbELP.parallel_microbELP import parallel_microbELP
 from microbELP.load_dic import load_dic
+from microbELP.lexicon_index import LexiconIndex
+from microbELP.lexicon_index import load_lexicon_index
+from microbELP.name_trie import NameTrie
+from microbELP.section_filter import SectionFilter
+from microbELP.passage_cache import PassageCache
+from microbELP.annotation_engine import AnnotationEngine
 from microbELP.microbiomeAnnotator_condensed import Annotator
 from microbELP.parallel_microbiomeAnnotator_condensed import parallel_Annotator
 from microbELP.normalisation_only import microbiome_normalisation
+from microbELP.normalisation_only import Normaliser
+from microbELP.normalisation_only import microbiome_fuzzy_normalisation
+from microbELP.normalisation_only import microbiome_batch_normalisation
 from microbELP.master_positions_handler import generate_master_positions
 from microbELP.master_positions_handler import load_master_positions
 from microbELP.master_positions_handler import plot_phylogenetic_tree_with_master_positions
@@ -28,6 +37,8 @@ from microbELP.biosyn import microbiome_biosyn_normalisation
 from microbELP.biosyn import TextPreprocess
 from microbELP.biosyn import cache_or_load_dictionary
 from microbELP.biosyn import BioSyn
+from microbELP.model_registry import ModelRegistry
+from microbELP.model_registry import model_registry
 from microbELP.dl_ner import microbiome_DL_ner
 from microbELP.dl_ner import create_sublists
 from microbELP.dl_ner import adjust_boudaries
@@ -36,5 +47,7 @@ from microbELP.dl_ner import adjust_wc
 from microbELP.dl_ner import adjust_spp
 from microbELP.dl_ner import remove_nested_annotations
 from microbELP.dl_ner import merge_overlapping_annotations
+from microbELP.dl_batching import WindowBatcher
 from microbELP.microbELP_DL import microbELP_DL
+from microbELP.parallel_microbELP_DL import parallel_microbELP_DL
 from microbELP.pmcid_ac_generation import pmcid_to_microbiome
@@ -0,0 +1,565 @@
+import time
+from microbELP.lexicon_index import load_lexicon_index
+from microbELP.tokenizer import tokenize, latin_variant
+from microbELP.boundary_rules import MISMATCH_RULES, BOUNDARY_RULES, apply_boundary_rules
+from microbELP.section_filter import SectionFilter
+
+ANNOTATOR = "microbELP@omicsNLP.ic.ac.uk"
+
+def name_span(text, start, end, name, fold):
+    """
+    Bounds of the lexicon name ``name`` matched on the words ``text[start:end]``, without the
+    brackets and punctuation the passage puts around it ('(Lactobacillus sp. ABC),').
+    """
+    first, last = fold(name.split(" ")[0]), fold(name.split(" ")[-1])
+    while end > start and text[end - 1] in '.,()' and not fold(text[start:end]).endswith(last):
+        end -= 1
+    while start < end and text[start] in '.,()' and not fold(text[start:end]).startswith(first):
+        start += 1
+    return start, end
+
+class Span:
+    """
+    Compact record of one annotation while its passage is being processed.
+
+    Ambiguous mentions keep their candidate TaxIDs as a tuple in ``candidates`` until they are
+    resolved; the BioC annotation dict is only built by to_bioc() once the passage is finished.
+    """
+    __slots__ = ('id', 'text', 'offset', 'length', 'identifier', 'type', 'parent', 'candidates')
+
+    def __init__(self, id, text, offset):
+        self.id = id
+        self.text = text
+        self.offset = offset
+        self.length = len(text)
+        self.identifier = None
+        self.type = None
+        self.parent = None
+        self.candidates = None
+
+    def to_bioc(self, date):
+        return {
+            "text": self.text,
+            "infons": {
+                "identifier": self.identifier,
+                "type": self.type,
+                "annotator": ANNOTATOR,
+                "date": date,
+                "parent_taxonomic_id": self.parent
+            },
+            "id": self.id,
+            "locations": {
+                "length": self.length,
+                "offset": self.offset,
+            }
+        }
+
+class AnnotationEngine:
+    """
+    Rule-based microbiome annotator working on in-memory BioC data.
+
+    The lexicon is loaded once, when the engine is created, and reused by every call, so a
+    long-running process can keep one engine and annotate a BioC collection, a single passage
+    or raw text without going through the file system. Each public call starts from a fresh
+    annotation count and a fresh set of ambiguity groups, so results do not depend on what was
+    annotated before. An engine is not meant to be shared between threads.
+
+    Parameters
+    ----------
+    keyword : str or list
+        section type to annotate ('ALL' for every section), see microbELP(), or a list of section
+        types and IAO IDs such as ['results', 'IAO:0000318'] (see SectionFilter)
+    casesens : str
+        'YES' for case-sensitive matching, anything else for case-insensitive matching
+    count : int
+        number the annotation identifiers start from
+    lexicon : LexiconIndex
+        lexicon to annotate with, by default the one returned by load_lexicon_index()
+    passage_cache : PassageCache
+        cache of passage annotations shared across runs, by default no cache
+    """
+
+    # Boundary rule tables (see boundary_rules.py), replace them to plug in other rules
+    mismatch_rules = MISMATCH_RULES
+    boundary_rules = BOUNDARY_RULES
+
+    def __init__(self, keyword = 'ALL', casesens = 'no', count = 0, lexicon = None, passage_cache = None):
+        self.keyword = keyword
+        self.casesens = casesens
+        self.count = count
+        self.initial_count = count
+        self.timestamp = None
+        self.section_filter = SectionFilter(keyword)
+        self.lexicon = load_lexicon_index() if lexicon is None else lexicon
+        self.passage_cache = passage_cache
+        self.cache_settings = None
+        self.context_used = False
+
+    def start_run(self):
+        """
+        Reset the per-run state: annotation count and timestamp, shared by every annotation of the run,
+        and the section filter compiled from the keyword, with its counts of skipped passages.
+
+        Returns the ambiguity groups of the run. They are copied as abbreviations resolved during a
+        run are added to them.
+        """
+        self.count = self.initial_count
+        self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        self.section_filter = SectionFilter(self.keyword)
+        # What the annotations of a passage depend on besides its text, see PassageCache. The keyword
+        # only decides which passages are annotated, so it is not part of it.
+        rules = ",".join(rule.__name__ for rule in (*self.mismatch_rules, *self.boundary_rules))
+        self.cache_settings = f"{self.lexicon.version}|{'case-sensitive' if self.casesens == 'YES' else 'case-insensitive'}|{rules}"
+        return dict(self.lexicon.ambiguity_groups)
+
+    def annotate_bioc(self, data):
+        """
+        Annotate every passage of a BioC collection (a dict as loaded from a *_bioc.json file).
+
+        The 'annotations' of each passage are replaced in place, and ``data`` is returned.
+        """
+        strains = self.start_run()
+        for document in data['documents']:
+            self.annotate_document(document, 0, strains)
+        return data
+
+    def annotate_passage(self, passage):
+        """
+        Annotate a single BioC passage (a dict with 'text', 'offset' and 'infons').
+
+        The 'annotations' of the passage are replaced in place and returned.
+        """
+        return self.annotate_one_passage(passage, [], self.start_run(), 0)
+
+    def annotate_text(self, text, offset = 0):
+        """
+        Annotate raw text, whatever the keyword. Annotation offsets start at ``offset``.
+
+        Returns the list of annotations, in the BioC annotation format.
+        """
+        passage = {'infons': {}, 'text': text, 'offset': offset}
+        return self.annotate_one_passage(passage, [], self.start_run(), 0, selected = True)
+
+    def annotate_document(self, document, base, strains, progress = None):
+        """
+        Annotate the passages of one BioC document, in place.
+
+        ``base`` prefixes the annotation identifiers and ``strains`` holds the ambiguity groups of
+        the run; ``progress`` is called after each passage. Returns the taxa found in the document.
+        """
+        # Taxa found so far in the document, used to expand ambiguous abbreviations such as 'E. coli'
+        taxa_per_file = []
+        for para in document['passages']:
+            self.annotate_one_passage(para, taxa_per_file, strains, base)
+            if progress is not None:
+                progress()
+        return list({*taxa_per_file})
+
+    def annotate_one_passage(self, para, taxa_per_file, strains, base, selected = None):
+        if selected is None:
+            selected = self.section_filter(para)
+        if not selected:
+            # Dropped before tokenisation, only counted in section_filter.skipped
+            para['annotations'] = []
+            return para['annotations']
+        cache = self.passage_cache
+        if cache is None:
+            return self.match_passage(para, taxa_per_file, strains, base)
+        key = cache.key(para['text'], self.cache_settings)
+        entry = cache.get(key)
+        if entry is not None:
+            return self.replay_passage(para, entry, taxa_per_file, base)
+        annotations, entry = self.match_passage_entry(para, taxa_per_file, strains, base)
+        # Passages whose annotations depend on the rest of the document are not cached
+        if entry is not None:
+            cache.put(key, entry)
+        return annotations
+
+    def match_passage_entry(self, para, taxa_per_file, strains, base):
+        """
+        Match a passage. Returns its annotations and the entry replay_passage() can rebuild them
+        from anywhere in a run, or None instead of the entry when the annotations depend on the
+        passages annotated before it (abbreviations resolved from the taxa found earlier).
+        """
+        start_count = self.count
+        start_taxa = len(taxa_per_file)
+        self.context_used = False
+        annotations = self.match_passage(para, taxa_per_file, strains, base)
+        if self.context_used:
+            return annotations, None
+        return annotations, {
+            'count': self.count - start_count,
+            'taxa': taxa_per_file[start_taxa:],
+            'annotations': [[int(a['id'][len(str(base)):]) - start_count, a['text'], a['locations']['offset'] - para['offset'], a['locations']['length'],
+                             a['infons']['identifier'], a['infons']['type'], a['infons']['parent_taxonomic_id']] for a in annotations],
+        }
+
+    def annotate_detached(self, passages):
+        """
+        Annotate passages each on their own, e.g. one chunk of a document split across processes.
+
+        Returns, per passage, its entry for replay_passage(), or None when the passage is to be
+        annotated in document order by reconcile_document(): its section is not selected, or its
+        annotations depend on the passages before it.
+        """
+        strains = self.start_run()
+        entries = []
+        for para in passages:
+            if self.section_filter.selects(para['infons']):
+                entries.append(self.match_passage_entry(para, [], strains, 0)[1])
+            else:
+                entries.append(None)
+        return entries
+
+    def reconcile_document(self, document, entries, base, strains):
+        """
+        Annotate a document, in place, from the entries annotate_detached() returned for its
+        passages, as if it had been annotated in one go: passages are replayed in order so that
+        identifiers follow one another, and passages without an entry are annotated in turn, with
+        the taxa found in the passages before them. Returns the taxa found in the document.
+        """
+        taxa_per_file = []
+        for para, entry in zip(document['passages'], entries):
+            if entry is None:
+                self.annotate_one_passage(para, taxa_per_file, strains, base)
+            else:
+                self.replay_passage(para, entry, taxa_per_file, base)
+        return list({*taxa_per_file})
+
+    def replay_passage(self, para, entry, taxa_per_file, base):
+        """
+        Annotate a passage from its entry (see match_passage_entry()): identifiers continue the
+        annotation count and offsets are shifted by the passage offset, as if it had been matched.
+        """
+        spans = []
+        for n, text, offset, length, identifier, type, parent in entry['annotations']:
+            span = Span(str(base) + str(self.count + n), text, para['offset'] + offset)
+            span.length = length
+            span.identifier = identifier
+            span.type = type
+            span.parent = parent
+            spans.append(span)
+        self.count = self.count + entry['count']
+        taxa_per_file.extend(entry['taxa'])
+        para['annotations'] = [ian.to_bioc(self.timestamp) for ian in spans]
+        return para['annotations']
+
+    def match_passage(self, para, taxa_per_file, strains, base):
+        lexicon = self.lexicon
+        spans = []
+        textsection=para['text']
+        offsetoftext = para['offset']
+        # Word spans of the passage: (start, end, normalised form, Latin variant)
+        tokens = tokenize(textsection)
+        wordlist = [textsection[start:end] for start, end, _, _ in tokens]
+        cleanwords = [t[2] for t in tokens]
+        latinwords = [t[3] for t in tokens]
+        # needs_processing is subject to post-processing after the annotation pipeline is finished. 
+        needs_processing  = []
+        skipper = False
+        # Case policy: words are folded once here and looked up in the index folded the same way
+        view = lexicon.case_view(self.casesens == 'YES')
+        fold = view.fold
+        keys = view.fold_all(cleanwords)
+        latinkeys = latinwords if view.case_sensitive else [latin_variant(k) for k in keys]
+        # Lexicon names of three or more tokens, matched in one pass over the passage
+        long_names = view.name_trie.find_all(keys, 3)
+        skip_until = 0
+        # Words that can start a match, anything else is passed over with one set probe
+        first_tokens = view.first_tokens
+
+        for index, key in enumerate(keys):
+            if index < skip_until:
+                continue
+            if key not in first_tokens and index not in long_names and not (len(key) == 2 and key[1] == '.'):
+                skipper = False
+                continue
+            annot_stopper = False # Allows the use of multiple annotations for the same word. In case there is ambiguity in context. 
+            idinuse = [] 
+            duptxids = [] 
+            sentenceoffset = tokens[index][0]
+            if skipper == True:
+
+                skipper = False
+                continue
+            else:
+                try:
+
+                    finalword = cleanwords[index]
+                    if index in long_names:
+                        end, name = long_names[index]
+                        match = view.match(fold(name))
+                        # Text as written in the passage (punctuation kept), ambiguity looked up on the CleanName
+                        start, stop = name_span(textsection, tokens[index][0], tokens[end - 1][1], name, fold)
+                        self.AddAnnotation(textsection[start:stop], match, self.count, spans, " ", taxa_per_file, start, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper, name)
+                        skip_until = end
+                        continue
+                    #wordlist[index] = finalword 
+
+                    newkey = latinkeys[index]
+                    if key in view.by_name:
+
+                            match = view.match(key)
+
+                            if index <= len(wordlist) -2:
+                                            nextword = wordlist[index + 1]
+                                            if nextword not in [ 'sp.', 'spp.', 'gen.']:
+                                                nextword = cleanwords[index + 1]
+                                            nextkey = fold(nextword)
+                                            possible_species = finalword + " " + str(nextword)
+                                            possible_plural = finalword + " " + str(latinwords[index + 1])
+                                            species_key = key + " " + nextkey
+                                            plural_key = key + " " + latinkeys[index + 1]
+
+
+                                            #Genus species - Do not annotate the next word 
+
+                                            if species_key in view.by_name:
+                                                match = view.match(species_key)
+                                                modifier = "species"
+                                                self.AddAnnotation(possible_species, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                skipper = True
+                                                annot_stopper = True
+                                            #Genus species(pl) - Do not annotate the next word
+                                            elif plural_key in view.by_name:
+                                                match = view.match(plural_key)
+                                                modifier = "species"
+                                                self.AddAnnotation(possible_plural, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                skipper = True
+                                                annot_stopper = True
+                                            # [Any] sp - Do not annotate the next word
+                                            elif nextkey in ['sp', 'spp', 'sp.', 'spp.']:
+                                                modifier = "species"
+                                                self.AddAnnotation(possible_species, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                skipper = True
+                                                annot_stopper = True
+                                            # [Any] genus - Do not annotate the next word
+                                            elif nextkey in ['genus', 'gen', 'gen.']:
+                                                modifier = "genus"
+                                                self.AddAnnotation(possible_species, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                skipper = True
+                                                annot_stopper = True
+                                            # [Any] Only one word, so continue to the next word.   (middle of text)
+                                            else:
+                                                self.AddAnnotation(finalword, match, self.count, spans, " ", taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                skipper = False
+                                                annot_stopper = True
+                            # [Any] Only one word, so continue to the next word.   (words at the end of the text)
+                            elif index == len(wordlist) -1 :
+                                self.AddAnnotation(finalword, match, self.count, spans, " ", taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                skipper = False
+                                annot_stopper = True
+
+                    else:
+                            if index <= len(wordlist) -2:
+                                    finalword = list(finalword)
+                                    nextword = cleanwords[index + 1]
+                                    nextkey = keys[index + 1]
+
+                                    species_key = key + " " + nextkey
+                                    possible_spec = "".join(finalword) + " " + str(nextword)
+                                    nonregistered_genus = view.names_with_token(key)
+                                    #Non registered genera eg: Escherichia/Shigella  coli or Anguillina coli
+                                    if len(nonregistered_genus) >= 1:
+                                            for nrg in nonregistered_genus:
+                                                if nrg == species_key:
+                                                        match = view.match(nrg)
+                                                        modifier = "species"
+                                                        self.AddAnnotation(possible_spec, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                        skipper = True
+                                                        annot_stopper = True
+                                                else:
+                                                    continue
+                                    #G. species. 
+                                    elif (len(finalword) == 2 and finalword[1] == '.' and finalword[0].isupper):
+
+                                                possible = lexicon.abbreviation_candidates(finalword[0], nextkey)
+                                                if len(possible) == 1:
+                                                        match = lexicon.match(possible[0])
+                                                        modifier = "species"
+                                                        self.AddAnnotation(possible_spec, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                        skipper = True
+                                                        annot_stopper = True
+                                                elif len(possible) >= 2:
+                                                        generalcheck = True
+                                                        # Resolved from the taxa found earlier in the document
+                                                        self.context_used = True
+                                                        for tpf in taxa_per_file:
+                                                                    if tpf in possible:
+                                                                            match = lexicon.match(tpf)
+                                                                            modifier = "species"
+                                                                            self.AddAnnotation(possible_spec, match, self.count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                                            skipper = True
+                                                                            annot_stopper = True
+                                                                            generalcheck == False
+                                                                    else:
+                                                                        continue
+                                                        for p in possible:
+                                                            match = lexicon.match(p)
+                                                            duptxids.append(match['TaxID'])
+                                                        if generalcheck == True:  
+                                                            strains[possible_spec] = len(duptxids)
+                                                            match = lexicon.match_taxid(duptxids[0]) 
+                                                            self.AddAnnotation(possible_spec, match, self.count, spans, " ", taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                                            annot_stopper = True
+                                                            skipper = True
+                                                        else:
+                                                            continue
+                                                else:
+                                                    continue
+                                    elif newkey in view.by_name: 
+
+                                        match = view.match(newkey)
+                                        self.AddAnnotation(finalword, match, self.count, spans, " ", taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                        skipper = False
+                                        annot_stopper = True 
+
+                                    else:
+                                        continue
+                            else:
+                                if newkey in view.by_name: 
+
+                                        match = view.match(newkey)
+                                        self.AddAnnotation(finalword, match, self.count, spans, " ", taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper)
+                                        skipper = False
+                                        annot_stopper = True  
+                                else:
+                                    continue
+
+                except:
+                    pass
+        # Post processing ------------------------------------------------------------
+
+        # Adjust for strains
+        if needs_processing != []:
+             for ann, ian in enumerate(spans):
+                if ian.candidates is not None: # Finds ambiguous annotations
+                     # Look at surrounding annotations
+                     #What is others?
+                     others = []
+                     if ann == 0 and len(spans) != 1:
+                        others.append(spans[ann + 1].type)
+                     elif ann <= len(spans) - 2:
+                        if spans[ann - 1].candidates is None:
+                            others.append(spans[ann - 1].type)
+                        elif spans[ann + 1].candidates is None:
+                             others.append(spans[ann + 1].type)
+                        else: ian.type = 'unresolved'
+
+                     else:
+                            ian.type = 'unresolved'
+                     unresolved  = False
+                     for pid in ian.candidates:
+                          kind = self.MakeIdentifier(lexicon.match_taxid(pid), " ", "")
+                          if kind in others:
+                               match = lexicon.match_taxid(pid)
+                               resolved = Span(ian.id, ian.text, ian.offset)
+                               resolved.identifier = pid
+                               resolved.type = kind
+                               resolved.parent = match['ParentTaxID']
+                               spans.append(resolved)
+                               unresolved = False
+                               break
+                          else:
+                               unresolved = True
+                               continue
+                     if unresolved == True:
+                          ian.type = 'unresolved'
+
+        # Ambiguous annotations that were resolved are replaced by their resolution
+        spans = [ian for ian in spans if ian.candidates is None or ian.type == 'unresolved']
+        spans.sort(key = lambda e: (int(e.id)))
+        for ian in spans:
+
+              if ian.type == 'unresolved':
+                 possible_ids = list(ian.candidates)
+                 itemstoadd = []
+                 trimmed = 0
+                 parentids = []
+                 if len(possible_ids) >= 4:
+                       trimmed = len(possible_ids)
+                       possible_ids = [possible_ids[0], possible_ids[len(possible_ids) -1]]
+                 for pid in possible_ids:
+                    match = lexicon.match_taxid(pid)
+                    identifier = self.MakeIdentifier(match," ","")    
+                    itemstoadd.append(identifier)
+                    parentids.append(match['ParentTaxID'])
+                 ian.identifier = possible_ids
+                 ian.type = itemstoadd
+                 ian.parent = parentids
+                 if trimmed != 0:
+                    ian.identifier = str(possible_ids) + " Trimmed from : " + str(trimmed)
+        # Boundary fixes
+        spans = self.postprocess_passage(para, spans)
+        para['annotations'] = [ian.to_bioc(self.timestamp) for ian in spans]
+        return para['annotations']
+
+    def postprocess_passage(self, para, spans):
+        """
+        Fix annotation boundaries against the passage text with the engine's boundary rule tables.
+        Returns the annotations kept.
+        """
+        return apply_boundary_rules(spans, para['text'], para['offset'], self.mismatch_rules, self.boundary_rules)
+
+    def AddAnnotation(self, word, match, count, spans, modifier, taxa_per_file, sentenceoffset, offsetoftext, strains, lexicon, duptxids, idinuse, needs_processing, base, annot_stopper, name = None):
+        # name: CleanName the mention matched, when it differs from the text as written (see match_passage)
+        if name is None:
+            name = word
+        if match['TaxID'] not in idinuse and annot_stopper == False:
+
+            self.count = int(count) + 1
+            if name in strains:
+                if name not in lexicon.ambiguity_groups:
+                    # Ambiguity group added earlier in the run
+                    self.context_used = True
+
+                #repeats = int(strains[word])
+                if duptxids == []:
+                    duptxids = lexicon.taxids(name)
+
+
+                typels = []
+                parentls = []
+
+                for i in duptxids:
+
+                            match = lexicon.match_taxid(i)
+
+                            typemod = self.MakeIdentifier(match, " ", "") 
+                            typels.append(typemod)
+                            parentls.append(match['ParentTaxID'])
+                duptxids = list(dict.fromkeys(duptxids))
+            span = Span(str(base) + str(count), word, sentenceoffset + offsetoftext)
+            if modifier != " " or duptxids == []:
+                    span.identifier = match['TaxID']
+                    span.type = self.MakeIdentifier(match, modifier, "")
+                    span.parent = match['ParentTaxID']
+                    taxa_per_file.append(str(match['CleanName']))
+            else:
+                    # Ambiguous mention, resolved from its neighbours once the passage is annotated
+                    span.candidates = tuple(duptxids)
+                    span.type = typels
+                    span.parent = parentls
+                    needs_processing.append(span.candidates)
+                    taxa_per_file.append(word)
+            idinuse.append(match['TaxID'])
+            spans.append(span)
+
+    def MakeIdentifier (self, match, modifier, identifier):
+          kingdic = {'NCBI:txid2': 'bacteria', 'NCBI:txid2157':'archaea', 'NCBI:txid4751':'fungi'}
+          kingdom = kingdic[match['KingdomID']]
+          if modifier != " ":
+                identifier = kingdom + "_" + modifier
+          else:
+                identifier = kingdom + "_" + match['TaxRank']
+          return identifier
+# Latin noun endings
+'''
+G1      F       puella      puellae
+G2      M       servus      servi
+G2      N       templum     templa
+G3      M/F     rex         reges
+G3      N       corpus      corpora
+G3 are difficult because the noun stem changes. Most of the focus should be therefore on G1 and G2. 
+G4 and G5 are uncommon and don't change much in nominative singular and plural. 
+'''
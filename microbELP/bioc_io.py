@@ -0,0 +1,224 @@
+import os
+import gzip
+import json
+import queue
+import uuid
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps_bioc(data, compact = False, indent = 4, ensure_ascii = True, fast = True):
+    """
+    Serialise a BioC collection to UTF-8 bytes.
+
+    Parameters
+    ----------
+    compact : bool
+        no indentation or whitespace between items
+    indent : int
+        indentation used when not compact
+    fast : bool
+        use orjson when it is installed and can produce the requested output: compact or
+        2-space indent, without ``ensure_ascii`` (orjson always writes non-ASCII characters
+        as UTF-8), so the output is the same whether orjson is installed or not
+    """
+    if fast and orjson is not None and not ensure_ascii and (compact or indent == 2):
+        try:
+            if compact:
+                return orjson.dumps(data)
+            return orjson.dumps(data, option = orjson.OPT_INDENT_2)
+        except TypeError:
+            pass
+    if compact:
+        return json.dumps(data, separators = (',', ':'), ensure_ascii = ensure_ascii).encode('utf-8')
+    return json.dumps(data, indent = indent, ensure_ascii = ensure_ascii).encode('utf-8')
+
+def bioc_output_path(path, compress = False):
+    """
+    Final name of an output file: ``path`` with '.gz' appended when compressing.
+    """
+    if compress and not path.endswith('.gz'):
+        return path + '.gz'
+    return path
+
+def write_bioc(data, path, compact = False, compress = False, indent = 4, ensure_ascii = True, fast = True):
+    """
+    Write a BioC collection exactly once, through a temporary file in the same directory that is
+    atomically renamed over ``path``. A crash mid-write never leaves a truncated output behind.
+
+    Returns the path written, which ends with '.gz' when ``compress`` is set.
+    """
+    path = bioc_output_path(path, compress)
+    payload = dumps_bioc(data, compact = compact, indent = indent, ensure_ascii = ensure_ascii, fast = fast)
+    directory = os.path.dirname(os.path.abspath(path))
+    # Leading dot and '.tmp' suffix keep partial files out of the '*_bioc.json' resume globs. Created
+    # with mode 0o666 so the kernel applies the umask and the output gets the usual permissions.
+    tmp_path = os.path.join(directory, '.' + os.path.basename(path) + '.' + uuid.uuid4().hex[:12] + '.tmp')
+    fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if compress:
+                with gzip.GzipFile(filename = os.path.basename(path)[:-3], mode = 'wb', fileobj = f, mtime = 0) as gz:
+                    gz.write(payload)
+            else:
+                f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def bioc_done_name(filename):
+    """
+    Name of the input file an output file was produced from ('PMC1_bioc.json.gz' -> 'PMC1_bioc.json'),
+    or None for anything that is not a finished BioC output.
+    """
+    if filename.endswith('_bioc.json'):
+        return filename
+    if filename.endswith('_bioc.json.gz'):
+        return filename[:-3]
+    return None
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+_END = object()
+
+def prefetch_bioc(paths, depth = 2, max_bytes = 256 << 20):
+    """
+    Yield ``(path, data)`` for each BioC file of ``paths``, in order, while a background thread
+    reads and parses the next files.
+
+    At most ``depth`` parsed files wait to be consumed, and files are only read ahead while the
+    files waiting add up to less than ``max_bytes`` on disk (a larger file is still read once the
+    queue is empty), so memory stays bounded. ``depth = 0`` reads each file when it is needed.
+    An error reading a file is raised when that file is reached.
+    """
+    if depth < 1:
+        for path in paths:
+            with open(path, encoding = 'utf-8') as f:
+                yield path, json.load(f)
+        return
+    items = queue.Queue(maxsize = depth)
+    room = threading.Condition()
+    pending = [0]
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up once the consumer has stopped, so the thread never blocks on a full queue
+        while not stop.is_set():
+            try:
+                items.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            with room:
+                while pending[0] > 0 and pending[0] + size > max_bytes and not stop.is_set():
+                    room.wait()
+                pending[0] += size
+            try:
+                with open(path, encoding = 'utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                data = _Failure(e)
+            if not put((path, data, size)):
+                return
+        put((None, _END, 0))
+
+    thread = threading.Thread(target = reader, name = 'bioc-prefetch', daemon = True)
+    thread.start()
+    try:
+        while True:
+            path, data, size = items.get()
+            if data is _END:
+                break
+            with room:
+                pending[0] -= size
+                room.notify()
+            if isinstance(data, _Failure):
+                raise data.error
+            yield path, data
+    finally:
+        stop.set()
+        with room:
+            room.notify()
+
+class BiocWriter:
+    """
+    Write-behind stage: finished BioC collections are serialised and written with write_bioc() by
+    a background thread while the next document is annotated.
+
+    submit() blocks while ``depth`` collections are already waiting, which bounds the memory held
+    by finished documents; ``depth = 0`` writes in the calling thread. ``done(output_path)`` is
+    called once a file is written, e.g. to record it in the run ledger. close() (or leaving the
+    ``with`` block) waits for every write and raises the first error met.
+    """
+
+    def __init__(self, depth = 2):
+        self.depth = depth
+        self.error = None
+        if depth > 0:
+            self._items = queue.Queue(maxsize = depth)
+            self._thread = threading.Thread(target = self._run, name = 'bioc-writer', daemon = True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._items.get()
+            if item is _END:
+                return
+            if self.error is None:
+                try:
+                    self._write(*item)
+                except BaseException as e:
+                    self.error = e
+
+    @staticmethod
+    def _write(data, path, done, kwargs):
+        output_path = write_bioc(data, path, **kwargs)
+        if done is not None:
+            done(output_path)
+
+    def submit(self, data, path, done = None, **kwargs):
+        """
+        Queue ``data`` to be written to ``path``; ``kwargs`` are passed to write_bioc(). ``data``
+        must not be modified afterwards.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.depth > 0:
+            self._items.put((data, path, done, kwargs))
+        else:
+            self._write(data, path, done, kwargs)
+
+    def close(self):
+        if self.depth > 0 and self._thread.is_alive():
+            self._items.put(_END)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.depth > 0 and self._thread.is_alive():
+            # Files already annotated are still written, but an error here does not hide the original one
+            self._items.put(_END)
+            self._thread.join()
+        return False
@@ -1,6 +1,5 @@
 import torch
 import torch.nn as nn
-from torch.utils.data.dataloader import DataLoader
 from tqdm import tqdm
 import os
 import pickle
@@ -14,11 +13,12 @@ warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
 import numpy as np
 from transformers import (
     AutoTokenizer,
-    AutoModel,
-    default_data_collator
+    AutoModel
 )
 from huggingface_hub import hf_hub_download
 from microbELP import load_saved_dictionary
+from microbELP.dl_batching import length_batches
+from microbELP.model_registry import model_registry
 
 class SparseEncoder(object):
     def __init__(self, use_cuda=False):
@@ -63,16 +63,6 @@ class SparseEncoder(object):
 
         return self
     
-class NamesDataset(torch.utils.data.Dataset):
-    def __init__(self, encodings):
-        self.encodings = encodings
-
-    def __getitem__(self, idx):
-        return {key: val[idx].clone().detach() for key, val in self.encodings.items()}
-
-    def __len__(self):
-        return len(self.encodings.input_ids)
-
 class BioSyn(object):
     """
     Wrapper class for dense encoder and sparse encoder
@@ -227,6 +217,52 @@ class BioSyn(object):
 
         return topk_idxs
 
+    def retrieve_mentions(self, mentions, dict_sparse_embeds, dict_dense_embeds, topk, batch_size=256):
+        """
+        Return the topk dictionary indexes of each mention, embedding the mentions together
+        Parameters
+        ----------
+        mentions : list
+            preprocessed mentions (see TextPreprocess)
+        dict_sparse_embeds : np.array
+            sparse embeddings of the dictionary names
+        dict_dense_embeds : np.array
+            dense embeddings of the dictionary names
+        topk : int
+            The number of candidates
+        batch_size : int
+            number of mentions scored against the dictionary at once, which bounds the size of
+            the score matrices
+        Returns
+        -------
+        topk_idxs : np.array
+            2d numpy array of dictionary indexes [# of mentions, topk], best first
+        """
+        if len(mentions) == 0:
+            return np.zeros((0, topk), dtype=np.int64)
+        mention_sparse_embeds = self.embed_sparse(names=mentions)
+        mention_dense_embeds = self.embed_dense(names=mentions)
+        sparse_weight = self.get_sparse_weight().item()
+        topk_idxs = []
+        for start in range(0, len(mentions), batch_size):
+            end = min(start + batch_size, len(mentions))
+            sparse_score_matrix = self.get_score_matrix(
+                query_embeds=mention_sparse_embeds[start:end],
+                dict_embeds=dict_sparse_embeds
+            )
+            dense_score_matrix = self.get_score_matrix(
+                query_embeds=mention_dense_embeds[start:end],
+                dict_embeds=dict_dense_embeds
+            )
+            hybrid_score_matrix = sparse_weight * sparse_score_matrix + dense_score_matrix
+            topk_idxs.append(self.retrieve_candidate(
+                score_matrix = hybrid_score_matrix,
+                topk = topk
+            ))
+        topk_idxs = np.concatenate(topk_idxs, axis=0)
+
+        return topk_idxs
+
     def embed_sparse(self, names, show_progress=False):
         """
         Embedding data into sparse representations
@@ -274,22 +310,28 @@ class BioSyn(object):
         self.encoder.eval() # prevent dropout
         
         batch_size=1024
-        dense_embeds = []
+        dense_embeds = None
 
         if isinstance(names, np.ndarray):
             names = names.tolist()        
-        name_encodings = self.tokenizer(names, padding="max_length", max_length=self.max_length, truncation=True, return_tensors="pt")
-        if self.use_cuda:
-            name_encodings = name_encodings.to('cuda')
-        name_dataset = NamesDataset(name_encodings)
-        name_dataloader = DataLoader(name_dataset, shuffle=False, collate_fn=default_data_collator, batch_size=batch_size)
+        # Names are batched by token length and each batch is padded to its own longest name
+        # rather than to max_length; the [CLS] vectors are put back in the order of names
+        name_encodings = self.tokenizer(names, max_length=self.max_length, truncation=True)
+        batches = length_batches([len(ids) for ids in name_encodings['input_ids']], batch_size)
 
         with torch.no_grad():
-            for batch in tqdm(name_dataloader, disable=not show_progress, desc='embedding dictionary'):
+            for batch_idxs in tqdm(batches, disable=not show_progress, desc='embedding dictionary'):
+                batch = self.tokenizer.pad(
+                    {key: [val[i] for i in batch_idxs] for key, val in name_encodings.items()},
+                    return_tensors="pt"
+                )
+                if self.use_cuda:
+                    batch = batch.to('cuda')
                 outputs = self.encoder(**batch)
                 batch_dense_embeds = outputs[0][:,0].cpu().detach().numpy() # [CLS] representations
-                dense_embeds.append(batch_dense_embeds)
-        dense_embeds = np.concatenate(dense_embeds, axis=0)
+                if dense_embeds is None:
+                    dense_embeds = np.empty((len(names), batch_dense_embeds.shape[1]), dtype=batch_dense_embeds.dtype)
+                dense_embeds[batch_idxs] = batch_dense_embeds
         
         return dense_embeds
     
@@ -472,52 +514,30 @@ def microbiome_biosyn_normalisation(to_normalise, cpu = False, candidates_number
              print('GPU not detected, running the code using the CPU.')
              device = False
     
-    if ontology == '':
-        biosyn = BioSyn(
-                    max_length=max_lenght,
-                    use_cuda=device
-                )
-        biosyn.load_model(model_name_or_path=model_name_or_path)
-        dictionary, dict_sparse_embeds, dict_dense_embeds = cache_or_load_dictionary(biosyn, model_name_or_path)
-    else:
-        biosyn = BioSyn(
-                    max_length=max_lenght,
-                    use_cuda=device
-                )
-        biosyn.load_model(model_name_or_path=model_name_or_path)
-        dictionary, dict_sparse_embeds, dict_dense_embeds = cache_or_load_dictionary_ontology(biosyn, model_name_or_path, ontology)
-
+    # The normaliser and the embedded dictionary are built on the first call only, see ModelRegistry
+    biosyn, dictionary, dict_sparse_embeds, dict_dense_embeds = model_registry().biosyn(
+        model_name_or_path,
+        device = 'cuda' if device else 'cpu',
+        max_length = max_lenght,
+        ontology = ontology
+    )
+
+    # All the mentions are embedded and scored together (see BioSyn.retrieve_mentions)
+    preprocess = TextPreprocess()
+    mentions = [preprocess.run(original_mention) for original_mention in to_normalise]
+    hybrid_candidate_idxs = biosyn.retrieve_mentions(
+        mentions,
+        dict_sparse_embeds,
+        dict_dense_embeds,
+        topk = candidates_number
+    )
     final_output = []
     for i in range(len(to_normalise)):
-        original_mention = to_normalise[i]
-        # preprocess mention
-        mention = TextPreprocess().run(original_mention)
-        # embed mention
-        mention_sparse_embeds = biosyn.embed_sparse(names=[mention])
-        mention_dense_embeds = biosyn.embed_dense(names=[mention])
-        output = {
-            'mention': original_mention,
-        }
-        # calcuate score matrix and get top 5
-        sparse_score_matrix = biosyn.get_score_matrix(
-            query_embeds=mention_sparse_embeds,
-            dict_embeds=dict_sparse_embeds
-        )
-        dense_score_matrix = biosyn.get_score_matrix(
-            query_embeds=mention_dense_embeds,
-            dict_embeds=dict_dense_embeds
-        )
-        sparse_weight = biosyn.get_sparse_weight().item()
-        hybrid_score_matrix = sparse_weight * sparse_score_matrix + dense_score_matrix
-        hybrid_candidate_idxs = biosyn.retrieve_candidate(
-            score_matrix = hybrid_score_matrix, 
-            topk = candidates_number
-        )
         # get predictions from dictionary
-        predictions = dictionary[hybrid_candidate_idxs].squeeze(0)
+        predictions = dictionary[hybrid_candidate_idxs[i]]
         candidates = [{str(id_): str(mention)} for mention, id_ in predictions]
         result = {
-            "mention": original_mention,
+            "mention": to_normalise[i],
             "candidates": candidates
         }
         final_output.append(result)
@@ -0,0 +1,144 @@
+"""
+Boundary rules applied to the annotations of a passage once it has been annotated.
+
+Each rule takes an annotation Span, the passage text and the passage offset, and adjusts the
+span in place. apply_boundary_rules() visits each annotation once and runs the rule tables on
+it in order, so rules can be added, removed or reordered by passing other tables.
+"""
+
+import re
+
+def span_text(ann, text, base, extra = 0):
+    """
+    Passage text currently covered by ``ann`` (plus ``extra`` characters).
+    """
+    start = ann.offset - base
+    return text[start:start + ann.length + extra]
+
+def _cut_at(ann, text, base, marker):
+    current = span_text(ann, text, base)
+    if marker in current:
+        ann.text = current.split(marker)[0]
+        ann.length = len(ann.text)
+
+def span_whitespace(ann, text, base):
+    """Stretch a multi-word mention over the tabs, newlines or repeated spaces between its words."""
+    words = ann.text.split(' ')
+    if len(words) > 1:
+        m = re.compile(r'\s+'.join(map(re.escape, words))).match(text, ann.offset - base)
+        if m is not None:
+            ann.text = m.group()
+            ann.length = len(ann.text)
+
+def close_brackets(ann, text, base):
+    """Take in the brackets around a mention such as '(Bacillus subtilis)'."""
+    current = span_text(ann, text, base)
+    if '(' in current and ')' in current:
+        if ann.text == span_text(ann, text, base, 2).replace('(', '').replace(')', ''):
+            # the mention starts inside a bracket: skip the bracket itself
+            if current[0] == '(' and current.count('(') > 1:
+                ann.length = ann.length + 2
+                ann.offset = ann.offset + 1
+            else:
+                ann.length = ann.length + 2
+
+def cut_genus_bracket(ann, text, base):
+    """Cut the mention before ' (genu'."""
+    _cut_at(ann, text, base, ' (genu')
+
+def cut_genus_comma(ann, text, base):
+    """Cut the mention before ', genu'."""
+    _cut_at(ann, text, base, ', genu')
+
+def strip_trailing_punctuation(ann, text, base):
+    """Drop a trailing '.', ',' or space, or a trailing '. ' or ', '."""
+    current = span_text(ann, text, base)
+    if current[-1] == '.' or current[-1] == ',' or current[-1] == ' ':
+        ann.length = ann.length - 1
+        ann.text = span_text(ann, text, base)
+    elif current[-2:] == '. ' or current[-2:] == ', ':
+        ann.length = ann.length - 2
+        ann.text = span_text(ann, text, base)
+
+def cut_genus_closing_bracket(ann, text, base):
+    """Cut the mention before ') genu'."""
+    _cut_at(ann, text, base, ') genu')
+
+def cut_genus_closing_bracket_comma(ann, text, base):
+    """Cut the mention before '), gen'."""
+    _cut_at(ann, text, base, '), gen')
+
+def complete_escherichia_coli(ann, text, base):
+    """'Escherichia. col' -> 'Escherichia. coli'."""
+    if span_text(ann, text, base) == 'Escherichia. col':
+        ann.length = ann.length + 1
+        ann.text = span_text(ann, text, base)
+
+def cut_associated(ann, text, base):
+    """Cut the mention before ', associate'."""
+    _cut_at(ann, text, base, ', associate')
+
+def extend_species_suffix(ann, text, base):
+    """'Bacillus' followed by 'sp', 'sp.', 'spp' or 'spp.' -> 'Bacillus sp.'."""
+    following = text[ann.offset - base:].split()
+    for suffix in ('sp', 'sp.', 'spp', 'spp.'):
+        n = len(ann.text.split())
+        if n < len(following) and suffix == following[n]:
+            if n == 1 or following[n - 1] == ann.text.split()[-1]:
+                ann.text = ' '.join(following[:n + 1])
+                ann.length = len(ann.text)
+
+def strip_genus_word(ann, text, base):
+    """Drop a leading 'genus ' or a trailing ' genus'."""
+    if ann.text[-6:].lower() == ' genus':
+        ann.text = ann.text[:-6]
+        ann.length = len(ann.text)
+    if ann.text[:6].lower() == 'genus ':
+        ann.text = ann.text[6:]
+        ann.length = len(ann.text)
+        ann.offset = ann.offset + 6
+
+# Rules for annotations whose text no longer matches the passage at their location, in order
+MISMATCH_RULES = (
+    span_whitespace,
+    close_brackets,
+    cut_genus_bracket,
+    cut_genus_comma,
+    strip_trailing_punctuation,
+    cut_genus_closing_bracket,
+    cut_genus_closing_bracket_comma,
+    complete_escherichia_coli,
+    cut_associated,
+)
+
+# Rules for every annotation, applied after the mismatch rules
+BOUNDARY_RULES = (
+    extend_species_suffix,
+    strip_genus_word,
+)
+
+def apply_boundary_rules(spans, text, base, mismatch_rules = MISMATCH_RULES, boundary_rules = BOUNDARY_RULES):
+    """
+    Fix the boundaries of the annotations of one passage in a single pass.
+
+    Annotations that do not match the passage text at their location are sorted out first. If
+    they start on an unclosed '(' they are moved past it. If they run into a list (', ' or '.,'
+    after their first character) they are dropped. Anything else goes through ``mismatch_rules``.
+    Every annotation kept then goes through ``boundary_rules``. Returns the annotations kept, in
+    order.
+    """
+    kept = []
+    for ann in spans:
+        current = span_text(ann, text, base)
+        if ann.text != current:
+            if '(' == current[0] and current.count(')') == 0:
+                ann.offset = ann.offset + 1
+            elif ', ' == current[1:3] or '.,' == current[1:3]:
+                continue
+            else:
+                for rule in mismatch_rules:
+                    rule(ann, text, base)
+        for rule in boundary_rules:
+            rule(ann, text, base)
+        kept.append(ann)
+    return kept
@@ -0,0 +1,188 @@
+import json
+import time
+from collections import deque
+import torch
+from microbELP.dl_ner import create_sublists
+from microbELP.dl_ner import adjust_boudaries
+from microbELP.dl_ner import adjust_abbr
+from microbELP.dl_ner import adjust_wc
+from microbELP.dl_ner import adjust_spp
+from microbELP.dl_ner import remove_nested_annotations
+from microbELP.dl_ner import merge_overlapping_annotations
+
+def length_batches(lengths, batch_size):
+    """
+    Batches of at most ``batch_size`` indices into ``lengths``, grouping items of similar length:
+    the indices are sorted by length and cut into consecutive batches, so padding each batch to
+    its own longest item wastes little. Results computed per batch are put back in the original
+    order through the indices.
+    """
+    order = sorted(range(len(lengths)), key = lengths.__getitem__)
+    return [order[k:k + batch_size] for k in range(0, len(order), batch_size)]
+
+class Window:
+    """
+    One overflow window of a passage: its token ids and the character offsets of its tokens.
+    """
+    __slots__ = ('passage', 'seq', 'input_ids', 'token_type_ids', 'offsets')
+
+    def __init__(self, passage, seq, input_ids, token_type_ids, offsets):
+        self.passage = passage
+        self.seq = seq
+        self.input_ids = input_ids
+        self.token_type_ids = token_type_ids
+        self.offsets = offsets
+
+class WindowBatcher:
+    """
+    Runs the NER model over the overflow windows of many passages, ``batch_size`` windows per
+    forward pass.
+
+    Passages are queued with add(); their windows wait until a batch is full, whatever passage
+    or file they come from. The oldest waiting windows are run as soon as they fill whole batches,
+    grouped by length among themselves (see length_batches()), and each batch is padded to its
+    longest window, so short passages such as titles are not padded to the length of full
+    windows. The predictions of a window are read over its own tokens only, so the spans found
+    in a passage do not depend on the windows it was batched with.
+    Once done() is true for a passage, pop() returns the ``(start, end)`` character spans
+    predicted in it.
+    """
+
+    def __init__(self, tokenizer, model, device, batch_size = 32, max_length = 512, stride = 50):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.stride = stride
+        self.pending = []       # windows waiting for a batch, in order
+        self.remaining = {}     # passage id -> windows not predicted yet
+        self.spans = {}         # passage id -> (window seq, start, end) predicted so far
+        self._next_id = 0
+        self._next_seq = 0
+
+    def add(self, texts):
+        """
+        Queue passage texts and return their ids; every batch filled on the way is run.
+        """
+        ids = list(range(self._next_id, self._next_id + len(texts)))
+        self._next_id += len(texts)
+        for pid in ids:
+            self.remaining[pid] = 0
+            self.spans[pid] = []
+        if len(texts) == 0:
+            return ids
+        encoded = self.tokenizer(
+            texts,
+            truncation=True,
+            return_offsets_mapping=True,
+            return_overflowing_tokens=True,
+            max_length=self.max_length,
+            stride=self.stride
+        )
+        token_type_ids = encoded.get("token_type_ids")
+        for w, sample in enumerate(encoded["overflow_to_sample_mapping"]):
+            pid = ids[sample]
+            self.remaining[pid] += 1
+            self.pending.append(Window(pid, self._next_seq, encoded["input_ids"][w], None if token_type_ids is None else token_type_ids[w], encoded["offset_mapping"][w]))
+            self._next_seq += 1
+        if len(self.pending) >= self.batch_size:
+            self._run_pending(keep_partial = True)
+        return ids
+
+    def flush(self):
+        """Run the windows still waiting for a batch."""
+        self._run_pending(keep_partial = False)
+
+    def _run_pending(self, keep_partial):
+        # Only the oldest windows that fill whole batches run, grouped by length among themselves;
+        # the rest keep waiting in arrival order, so no window waits behind more than batch_size
+        # newer ones and the files in flight are yielded steadily
+        ready = len(self.pending) - len(self.pending) % self.batch_size if keep_partial else len(self.pending)
+        windows, self.pending = self.pending[:ready], self.pending[ready:]
+        for batch in length_batches([len(w.input_ids) for w in windows], self.batch_size):
+            self._run([windows[k] for k in batch])
+
+    def done(self, ids):
+        """Whether every window of the passages ``ids`` has been predicted."""
+        return all(self.remaining[pid] == 0 for pid in ids)
+
+    def pop(self, pid):
+        """Spans predicted in passage ``pid``, which is then forgotten."""
+        del self.remaining[pid]
+        # Windows may have been predicted out of order: spans are returned in text order
+        return [(start, end) for _, start, end in sorted(self.spans.pop(pid), key = lambda e: e[0])]
+
+    def _run(self, batch):
+        length = max(len(w.input_ids) for w in batch)
+        pad = self.tokenizer.pad_token_id or 0
+        input_ids = torch.full((len(batch), length), pad, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), length), dtype=torch.long)
+        for row, w in enumerate(batch):
+            input_ids[row, :len(w.input_ids)] = torch.tensor(w.input_ids, dtype=torch.long)
+            attention_mask[row, :len(w.input_ids)] = 1
+        inputs_for_model = {
+            "input_ids": input_ids.to(self.device),
+            "attention_mask": attention_mask.to(self.device)
+        }
+        if batch[0].token_type_ids is not None:
+            token_type_ids = torch.zeros((len(batch), length), dtype=torch.long)
+            for row, w in enumerate(batch):
+                token_type_ids[row, :len(w.token_type_ids)] = torch.tensor(w.token_type_ids, dtype=torch.long)
+            inputs_for_model["token_type_ids"] = token_type_ids.to(self.device)
+
+        with torch.no_grad():
+            outputs = self.model(**inputs_for_model)
+        predictions = torch.argmax(outputs.logits, dim=2).cpu().tolist()
+
+        for w, window_predictions in zip(batch, predictions):
+            tokens = self.tokenizer.convert_ids_to_tokens(w.input_ids)
+            to_identify = create_sublists(window_predictions[:len(w.input_ids)], w.offsets, tokens)
+            for k in range(len(to_identify)):
+                start = int(to_identify[k][0][0])
+                end = int(to_identify[k][-1][1])
+                if start != 0:
+                    self.spans[w.passage].append((w.seq, start, end))
+            self.remaining[w.passage] -= 1
+
+def passage_annotations(text, spans):
+    """
+    Annotations of a passage from the spans the NER model predicted in it, deduplicated and
+    with the boundary, abbreviation and nesting post-processing applied.
+    """
+    annotations = [
+        {'Entity': text[start:end], 'locations': {'offset': start, 'length': end - start}}
+        for start, end in dict.fromkeys(spans)
+    ]
+    annotations = adjust_boudaries(text, annotations)
+    annotations = adjust_abbr(text, annotations)
+    annotations = adjust_wc(text, annotations)
+    annotations = adjust_spp(text, annotations)
+    annotations = remove_nested_annotations(annotations)
+    annotations = merge_overlapping_annotations(text, annotations)
+    return annotations
+
+def batched_bioc_files(batcher, paths):
+    """
+    Generator of ``(path, BioC data, passage texts, passage spans, start)`` for the first
+    document of each BioC file, in the order of ``paths``; ``start`` is the time.perf_counter()
+    value when the file was read.
+
+    The passages of a file are queued in ``batcher`` as soon as it is read, so the last windows
+    of a file share their batch with the first windows of the next ones; a file is yielded once
+    all of its windows have been predicted.
+    """
+    in_flight = deque()
+    for path in paths:
+        start = time.perf_counter()
+        with open(path) as f:
+            d = json.load(f)
+        texts = [p['text'].replace('\n', ' ') for p in d['documents'][0]['passages']]
+        in_flight.append((path, d, texts, batcher.add(texts), start))
+        while in_flight and batcher.done(in_flight[0][3]):
+            path, d, texts, ids, start = in_flight.popleft()
+            yield path, d, texts, [batcher.pop(pid) for pid in ids], start
+    batcher.flush()
+    while in_flight:
+        path, d, texts, ids, start = in_flight.popleft()
+        yield path, d, texts, [batcher.pop(pid) for pid in ids], start
@@ -1,5 +1,5 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForTokenClassification
+from microbELP.model_registry import model_registry
 
 def create_sublists(lst, lst2, tokens):
     sublists = []
@@ -249,9 +249,6 @@ def merge_overlapping_annotations(text, annotations):
 
 def microbiome_DL_ner(input_text, cpu = False):
     if type(input_text) == str:
-        model_name = 'omicsNLP/microbELP_NER'
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForTokenClassification.from_pretrained(model_name)
         if not isinstance(cpu, bool):
             print('Parameter "cpu": Input error, this parameter only accepts a boolean as value. If "True" the code runs using the CPU otherwise, it will try to indentify if a GPU is available and will run on CPU if not.')
             return None
@@ -267,7 +264,8 @@ def microbiome_DL_ner(input_text, cpu = False):
                 else:
                     device = torch.device("cpu")
                     print('GPU not detected, running the code using the CPU.')
-        _ = model.to(device)
+        # Loaded on the first call only, see ModelRegistry
+        tokenizer, model = model_registry().ner(device = device)
         sentence_text = [input_text.replace('\n', ' ')]
         
         start_meta, len_meta, trigger_meta = [], [], []
@@ -337,9 +335,6 @@ def microbiome_DL_ner(input_text, cpu = False):
         return annotations
         
     elif type(input_text) == list:
-        model_name = 'omicsNLP/microbELP_NER'
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForTokenClassification.from_pretrained(model_name)
         if not isinstance(cpu, bool):
             print('Parameter "cpu": Input error, this parameter only accepts a boolean as value. If "True" the code runs using the CPU otherwise, it will try to indentify if a GPU is available and will run on CPU if not.')
             return None
@@ -355,7 +350,8 @@ def microbiome_DL_ner(input_text, cpu = False):
                 else:
                     device = torch.device("cpu")
                     print('GPU not detected, running the code using the CPU.')
-        _ = model.to(device)
+        # Loaded on the first call only, see ModelRegistry
+        tokenizer, model = model_registry().ner(device = device)
         final_annotation_list = []
         for kui in range(len(input_text)):
             sentence_text = [input_text[kui].replace('\n', ' ')]
@@ -0,0 +1,137 @@
+from itertools import combinations
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance between ``a`` and ``b`` (insertions, deletions,
+    substitutions and transpositions of adjacent characters), or ``max_distance + 1`` as soon
+    as it is known to exceed ``max_distance``.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # Typos are local: only the part between the common prefix and suffix is aligned
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        return len(a) + len(b)
+    if len(a) == 1 and len(b) == 1:
+        return 1
+    # Only the cells within max_distance of the diagonal can stay within max_distance
+    too_far = max_distance + 1
+    previous2 = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            if a[i - 1] == b[j - 1]:
+                d = previous[j - 1]
+            else:
+                d = min(previous[j], current[j - 1], previous[j - 1]) + 1
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1] and previous2[j - 2] + 1 < d:
+                    d = previous2[j - 2] + 1
+            current[j] = d
+            if d < best:
+                best = d
+        if best > max_distance:
+            return too_far
+        previous2, previous = previous, current
+    return min(previous[-1], too_far)
+
+def _deletes(word, max_distance):
+    # Every string obtained by deleting up to max_distance characters from word
+    found = {word}
+    for n in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), n):
+            found.add("".join(c for k, c in enumerate(word) if k not in positions))
+    return found
+
+class DeletionIndex:
+    """
+    Symmetric deletion index (as in SymSpell) over a vocabulary of words.
+
+    Every word is indexed under the strings obtained by deleting up to ``max_distance``
+    characters from its first ``prefix_length`` characters. Two words within ``max_distance``
+    edits of each other share at least one such string, so the words close to a query are
+    found by looking up the deletions of the query, then checked with edit_distance().
+    """
+
+    def __init__(self, words, max_distance = 2, prefix_length = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.by_prefix = {}     # prefix -> words starting with it
+        self.deletes = {}       # deletion of a prefix -> prefixes
+        for word in words:
+            if word == '':
+                continue
+            prefix = word[:prefix_length]
+            if prefix not in self.by_prefix:
+                self.by_prefix[prefix] = []
+                for d in _deletes(prefix, max_distance):
+                    self.deletes.setdefault(d, []).append(prefix)
+            self.by_prefix[prefix].append(word)
+
+    def lookup(self, word, max_distance = None):
+        """
+        ``(distance, word)`` pairs for the indexed words within ``max_distance`` edits of ``word``.
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        prefixes = set()
+        for d in _deletes(word[:self.prefix_length], max_distance):
+            prefixes.update(self.deletes.get(d, ()))
+        found = []
+        for prefix in prefixes:
+            for candidate in self.by_prefix[prefix]:
+                distance = edit_distance(word, candidate, max_distance)
+                if distance <= max_distance:
+                    found.append((distance, candidate))
+        return found
+
+class FuzzyIndex:
+    """
+    Typo-tolerant lookup of lower-cased lexicon names.
+
+    The words of the lexicon names go into a DeletionIndex. A mention is looked up word by word,
+    and only the names holding the close matches of its most selective word are compared with
+    the whole mention, so a lookup checks a handful of names rather than the whole lexicon.
+    Misplaced spaces ('Strepto coccus') are not corrected.
+    """
+
+    def __init__(self, lexicon, max_distance = 2, prefix_length = 7):
+        self.lexicon = lexicon
+        self.max_distance = max_distance
+        self.words = DeletionIndex(lexicon.lc_token_index, max_distance, prefix_length)
+        self.rank = {name: k for k, name in enumerate(lexicon.lc_names)}
+
+    def lookup(self, mention, max_distance = None):
+        """
+        ``(distance, name)`` pairs for the lower-cased names within ``max_distance`` edits of
+        ``mention``, closest first and in lexicon order for equal distances.
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        query = " ".join(mention.lower().split())
+        token_index = self.lexicon.lc_token_index
+        best = None
+        for word in set(query.split(" ")):
+            matches = [token for _, token in self.words.lookup(word, max_distance)]
+            size = sum(len(token_index[token]) for token in matches)
+            if best is None or size < best[0]:
+                best = (size, matches)
+        if best is None:
+            return []
+        found = []
+        for name in {name for token in best[1] for name in token_index[token]}:
+            distance = edit_distance(query, name, max_distance)
+            if distance <= max_distance:
+                found.append((distance, name))
+        found.sort(key = lambda e: (e[0], self.rank[e[1]]))
+        return found
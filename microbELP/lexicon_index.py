@@ -0,0 +1,301 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import tempfile
+from microbELP.load_dic import load_dic
+from microbELP.name_trie import NameTrie
+from microbELP.tokenizer import latin_variant
+
+# Bump whenever the LexiconIndex layout changes so stale artifacts are rebuilt
+LEXICON_FORMAT_VERSION = 3
+_ARTIFACT_MAGIC = b'microbELP-lexicon\n'
+
+class LexiconIndex:
+    """
+    Hash-indexed view over the load_dic() lexicon.
+
+    Every lookup the annotators used to do with a linear scan over the
+    dictionary (``next(l for l in dict_data if ...)``) is answered here by a
+    single dict probe.
+    """
+
+    def __init__(self, dict_data, version = None):
+        self.entries = dict_data
+        # Content hash of the dictionary this index was built from (see lexicon_content_hash()),
+        # the lexicon version recorded in the run ledger and used in passage cache keys
+        self.version = version
+        self.by_name = {}       # CleanName -> [entries]
+        self.by_lc_name = {}    # lower-cased CleanName -> [entries]
+        self.by_taxid = {}      # TaxID -> first entry with this TaxID
+        for entry in dict_data:
+            self.by_name.setdefault(entry['CleanName'], []).append(entry)
+            self.by_lc_name.setdefault(entry['CleanName'].lower(), []).append(entry)
+            self.by_taxid.setdefault(entry['TaxID'], entry)
+        # Unique names, in lexicon order
+        self.names = list(self.by_name)
+        self.lc_names = list(self.by_lc_name)
+        # Ambiguity groups: clean names shared by more than one lexicon entry (strains, homonyms)
+        self.ambiguity_groups = {name: [e['TaxID'] for e in group] for name, group in self.by_name.items() if len(group) > 1}
+        self.lc_ambiguity_groups = {name: [e['TaxID'] for e in group] for name, group in self.by_lc_name.items() if len(group) > 1}
+        # Inverted indexes: token -> names containing it, (genus initial, token) -> names
+        self.token_index = self._build_token_index(self.names)
+        self.lc_token_index = self._build_token_index(self.lc_names)
+        self.abbreviation_index = {}
+        for name in self.names:
+            tokens = name.split(" ")
+            if tokens[0] == '':
+                continue
+            for token in dict.fromkeys(tokens):
+                self.abbreviation_index.setdefault((tokens[0][0], token), []).append(name)
+        # Token tries for multi-token names (case-sensitive and case-folded)
+        self.name_trie = NameTrie(self.names)
+        self.lc_name_trie = NameTrie(self.names, fold = True)
+        # Prefilter: every word that can start a match (see _first_tokens())
+        self.first_tokens = self._first_tokens(self.names)
+        self.lc_first_tokens = self._first_tokens(self.lc_names)
+
+    @staticmethod
+    def _build_token_index(names):
+        index = {}
+        for name in names:
+            for token in dict.fromkeys(name.split(" ")):
+                index.setdefault(token, []).append(name)
+        return index
+
+    @staticmethod
+    def _first_tokens(names):
+        """
+        Words that can start a match: the first word of every name, and every word whose Latin
+        variant (see latin_variant()) is a one-word name ('Rhizobii' for 'Rhizobius').
+        """
+        tokens = set()
+        for name in names:
+            first = name.split(" ")[0]
+            tokens.add(first)
+            if first == name:
+                for plural in (name[:-1] + 'ae', name[:-2] + 'i', name[:-2] + 'a'):
+                    if latin_variant(plural) == name:
+                        tokens.add(plural)
+        return frozenset(tokens)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, name):
+        """First lexicon entry whose CleanName is ``name``, or None."""
+        group = self.by_name.get(name)
+        return group[0] if group else None
+
+    def match_lower(self, lc_name):
+        """First lexicon entry whose lower-cased CleanName is ``lc_name``, or None."""
+        group = self.by_lc_name.get(lc_name)
+        return group[0] if group else None
+
+    def match_taxid(self, taxid):
+        """First lexicon entry with this TaxID, or None."""
+        return self.by_taxid.get(taxid)
+
+    def taxids(self, name):
+        """Every TaxID registered under the CleanName ``name``."""
+        return [e['TaxID'] for e in self.by_name.get(name, [])]
+
+    def names_with_token(self, token):
+        """Clean names having ``token`` as one of their words, in lexicon order."""
+        return self.token_index.get(token, [])
+
+    def lc_names_with_token(self, token):
+        """Lower-cased clean names having ``token`` as one of their words, in lexicon order."""
+        return self.lc_token_index.get(token, [])
+
+    def abbreviation_candidates(self, initial, token):
+        """
+        Clean names that an abbreviated mention such as 'E. coli' can expand to: names whose
+        first word starts with ``initial`` and that contain ``token`` as one of their words.
+        """
+        return self.abbreviation_index.get((initial, token), [])
+
+    def case_view(self, case_sensitive):
+        """CaseView of this lexicon for case-sensitive (True) or case-insensitive (False) matching."""
+        return CaseView(self, case_sensitive)
+
+
+def _same_case(word):
+    return word
+
+class CaseView:
+    """
+    Lookups of a LexiconIndex under one case policy.
+
+    Keys are folded once with ``fold`` (identity, or str.lower when matching is case-insensitive)
+    and then probe the index folded the same way when the lexicon was built, so both policies
+    share one matching code path and cost one dict probe per lookup.
+    """
+
+    def __init__(self, lexicon, case_sensitive):
+        self.lexicon = lexicon
+        self.case_sensitive = case_sensitive
+        if case_sensitive:
+            self.fold = _same_case
+            self.by_name = lexicon.by_name
+            self.token_index = lexicon.token_index
+            self.name_trie = lexicon.name_trie
+            self.first_tokens = lexicon.first_tokens
+        else:
+            self.fold = str.lower
+            self.by_name = lexicon.by_lc_name
+            self.token_index = lexicon.lc_token_index
+            self.name_trie = lexicon.lc_name_trie
+            self.first_tokens = lexicon.lc_first_tokens
+
+    def fold_all(self, words):
+        """Folded keys of ``words`` (the list itself when matching is case-sensitive)."""
+        if self.case_sensitive:
+            return words
+        return [w.lower() for w in words]
+
+    def match(self, key):
+        """First lexicon entry whose folded CleanName is ``key``, or None."""
+        group = self.by_name.get(key)
+        return group[0] if group else None
+
+    def names_with_token(self, key):
+        """Folded clean names having ``key`` as one of their words, in lexicon order."""
+        return self.token_index.get(key, [])
+
+
+def lexicon_cache_dir():
+    """
+    Directory holding the compiled lexicon artifact, ``$MICROBELP_CACHE_DIR`` or ``~/.cache/microbELP``.
+    """
+    return os.environ.get('MICROBELP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'microbELP'))
+
+def lexicon_artifact_path():
+    """
+    Path of the compiled lexicon artifact.
+    """
+    return os.path.join(lexicon_cache_dir(), 'lexicon_index.pkl')
+
+def lexicon_fingerprint():
+    """
+    Fingerprint of the source dictionary files: the load_dic module and the data files shipped
+    next to it (path, size and modification time), plus the artifact format version. Any change
+    to these files yields a new fingerprint, which invalidates the compiled artifact; being cheap
+    to compute, it is only used for that check (see lexicon_content_hash() for the version).
+    """
+    source = os.path.abspath(sys.modules[load_dic.__module__].__file__)
+    source_dir = os.path.dirname(source)
+    paths = [source] + sorted(
+        os.path.join(source_dir, f) for f in os.listdir(source_dir)
+        if not f.endswith(('.py', '.pyc')) and os.path.isfile(os.path.join(source_dir, f))
+    )
+    h = hashlib.sha1(str(LEXICON_FORMAT_VERSION).encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f'|{path}|{st.st_size}|{st.st_mtime_ns}'.encode())
+    return h.hexdigest()
+
+def lexicon_content_hash(dict_data):
+    """
+    Hash of the dictionary entries themselves, the same wherever and whenever the package is
+    installed: reinstalling or moving the package leaves it, and so the annotations already
+    done with this dictionary, valid.
+    """
+    h = hashlib.sha1()
+    for entry in dict_data:
+        h.update(json.dumps(entry, sort_keys = True, ensure_ascii = False).encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+def save_lexicon_index(lexicon, path, source):
+    """
+    Write a compiled LexiconIndex to ``path`` (header with the ``source`` fingerprint + pickle),
+    through a temp file and an atomic rename.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok = True)
+    fd, tmp_path = tempfile.mkstemp(dir = directory, prefix = '.lexicon-', suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_ARTIFACT_MAGIC)
+            f.write(source.encode() + b'\n')
+            pickle.dump(lexicon, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def read_lexicon_index(path, source = None):
+    """
+    Load a compiled LexiconIndex from ``path``. The header is checked before the index is
+    unpickled, so a stale artifact is rejected without reading the rest of the file.
+
+    Returns None if the file is missing, unreadable, or was compiled from dictionary files whose
+    fingerprint (see lexicon_fingerprint()) differs from ``source``.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(_ARTIFACT_MAGIC)) != _ARTIFACT_MAGIC:
+                return None
+            stored_source = f.readline().rstrip(b'\n').decode()
+            if source is not None and stored_source != source:
+                return None
+            return pickle.load(f)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+
+def compile_lexicon_index(path = None):
+    """
+    Build the LexiconIndex from load_dic() and write it to ``path`` (by default in lexicon_cache_dir()).
+    """
+    if path is None:
+        path = lexicon_artifact_path()
+    source = lexicon_fingerprint()
+    dict_data = load_dic()
+    lexicon = LexiconIndex(dict_data, version = lexicon_content_hash(dict_data))
+    try:
+        save_lexicon_index(lexicon, path, source)
+    except OSError as e:
+        print(f'Could not write the compiled lexicon to {path}: {e}')
+    return lexicon
+
+
+_lexicon_index = None
+
+def load_lexicon_index(use_artifact = True):
+    """
+    Return the process-wide LexiconIndex.
+
+    On first use the compiled artifact is loaded from lexicon_cache_dir(); it is (re)built from
+    load_dic() when missing or when the source dictionary has changed since it was compiled.
+    """
+    global _lexicon_index
+    if _lexicon_index is None:
+        if use_artifact:
+            path = lexicon_artifact_path()
+            lexicon = read_lexicon_index(path, lexicon_fingerprint())
+            if lexicon is None:
+                lexicon = compile_lexicon_index(path)
+        else:
+            dict_data = load_dic()
+            lexicon = LexiconIndex(dict_data, version = lexicon_content_hash(dict_data))
+        _lexicon_index = lexicon
+    return _lexicon_index
+
+def init_worker_lexicon(path, version):
+    """
+    Pool initializer sharing the parent's lexicon, of version ``version``, with the workers.
+
+    Forked workers already hold the parent's index (shared copy-on-write) and keep it; spawned
+    workers load their own copy from the compiled artifact the parent wrote, which is much faster
+    than rebuilding it from load_dic().
+    """
+    global _lexicon_index
+    if _lexicon_index is not None and _lexicon_index.version == version:
+        return
+    lexicon = read_lexicon_index(path)
+    _lexicon_index = lexicon if lexicon is not None and lexicon.version == version else None
+    if _lexicon_index is None:
+        load_lexicon_index()
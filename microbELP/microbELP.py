@@ -10,7 +10,7 @@ import glob
 from microbELP.load_dic import load_dic
 from microbELP.microbiomeAnnotator_condensed import Annotator as ann
 
-def microbELP(input_directory, output_directory = './', count = 0, keyword = 'ALL', casesens = 'no'):
+def microbELP(input_directory, output_directory = './', count = 0, keyword = 'ALL', casesens = 'no', compact = False, compress = False, cache_size = 0, io_depth = 2):
     if type(input_directory) != str:
         print('Parameter "input_directory": Input error, this function only accepts a string directory with BioC files to be annotated with "*_bioc.json", e.g. for "./bioc/*_bioc.json", requires "./bioc" as input.')
         return None
@@ -21,5 +21,20 @@ def microbELP(input_directory, output_directory = './', count = 0, keyword = 'AL
         return None
     else:
         pass
-    result = ann(input_directory, output_directory, count, keyword, casesens)
+    if type(compact) != bool or type(compress) != bool:
+        print('Parameters "compact" and "compress": Input error, these parameters only accept a boolean. "compact" writes the output without indentation, "compress" writes it gzip-compressed as "*_bioc.json.gz".')
+        return None
+    else:
+        pass
+    if type(cache_size) != int or cache_size < 0:
+        print('Parameter "cache_size": Input error, this parameter only accepts a non-negative int, the maximum number of passages kept in the persistent passage cache ("0" disables the cache).')
+        return None
+    else:
+        pass
+    if type(io_depth) != int or io_depth < 0:
+        print('Parameter "io_depth": Input error, this parameter only accepts a non-negative int, the number of files read ahead and waiting to be written in background threads ("0" reads and writes each file in turn).')
+        return None
+    else:
+        pass
+    result = ann(input_directory, output_directory, count, keyword, casesens, compact, compress, cache_size, io_depth)
     result.initialsteps()
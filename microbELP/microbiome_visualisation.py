@@ -1,6 +1,6 @@
 from microbELP.rank_counts import create_filtered_rank_abundances_dict, create_qvalue_dict
 from microbELP.master_positions_handler import plot_phylogenetic_tree_with_master_positions, generate_master_positions
-from microbELP.load_dic import load_dic
+from microbELP.lexicon_index import load_lexicon_index
 from microbELP.overlay import plot_study_dataset_on_tree
 from microbELP.stats import empirical_sampling_comparison
 import os
@@ -118,12 +118,12 @@ def phylogenetic_tree_microbiome(input_path,
 
     
     ### generate master positions from combined microbiome data
-    ncbi_taxonomy = load_dic()
+    ncbi_taxonomy = load_lexicon_index().entries
     
     tax_id_2_name = {item['TaxID']: None for item in ncbi_taxonomy}
     tax_id_2_name = {item['TaxID']: item['CleanName'] for item in ncbi_taxonomy if tax_id_2_name.get(item['TaxID']) is None}
     
-    ncbi_taxonomy = load_dic()
+    ncbi_taxonomy = load_lexicon_index().entries
     combined_data = create_filtered_rank_abundances_dict(ncbi_taxonomy, dataset, verbose = verbose)
     master_positions = generate_master_positions(combined_data, verbose = verbose)
     
@@ -276,12 +276,12 @@ def comparative_phylogenetic_tree_microbiome(back_input_path,
                     else:
                         general_dataset.extend(data['documents'][0]['passages'][current_id[i]]['annotations'][j]['infons']['identifier'])
 
-    ncbi_taxonomy = load_dic()
+    ncbi_taxonomy = load_lexicon_index().entries
     
     tax_id_2_name = {item['TaxID']: None for item in ncbi_taxonomy}
     tax_id_2_name = {item['TaxID']: item['CleanName'] for item in ncbi_taxonomy if tax_id_2_name.get(item['TaxID']) is None}
     
-    ncbi_taxonomy = load_dic()
+    ncbi_taxonomy = load_lexicon_index().entries
     general_combined_data = create_filtered_rank_abundances_dict(ncbi_taxonomy, general_dataset, verbose = verbose)
     master_positions = generate_master_positions(general_combined_data, verbose = verbose)
     
@@ -364,12 +364,12 @@ def comparative_phylogenetic_tree_microbiome(back_input_path,
                     else:
                         domain_dataset.extend(data['documents'][0]['passages'][current_id[i]]['annotations'][j]['infons']['identifier'])
 
-    ncbi_taxonomy = load_dic()
+    ncbi_taxonomy = load_lexicon_index().entries
     
     tax_id_2_name = {item['TaxID']: None for item in ncbi_taxonomy}
     tax_id_2_name = {item['TaxID']: item['CleanName'] for item in ncbi_taxonomy if tax_id_2_name.get(item['TaxID']) is None}
     
-    ncbi_taxonomy = load_dic()
+    ncbi_taxonomy = load_lexicon_index().entries
     combined_data = create_filtered_rank_abundances_dict(ncbi_taxonomy, domain_dataset, verbose = verbose)
     master_positions = generate_master_positions(combined_data, verbose = verbose)
     
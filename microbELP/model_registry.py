@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+import torch
+from transformers import AutoTokenizer, AutoModelForTokenClassification
+
+NER_MODEL = 'omicsNLP/microbELP_NER'
+NEN_MODEL = 'omicsNLP/microbELP_NEN'
+
+def model_nbytes(model):
+    """Memory held by the parameters and buffers of a torch module, in bytes."""
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+def _load_ner(model_name, device, dtype):
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForTokenClassification.from_pretrained(model_name)
+    model = model.to(device) if dtype is None else model.to(device = device, dtype = dtype)
+    model.eval()
+    return (tokenizer, model), model_nbytes(model)
+
+def _load_biosyn(model_name_or_path, device, dtype, max_length, ontology):
+    # Imported here: biosyn imports the package, which imports this module
+    from microbELP.biosyn import BioSyn, cache_or_load_dictionary, cache_or_load_dictionary_ontology
+    biosyn = BioSyn(
+                max_length=max_length,
+                use_cuda=device.type == 'cuda'
+            )
+    biosyn.load_model(model_name_or_path=model_name_or_path)
+    if dtype is not None:
+        biosyn.encoder = biosyn.encoder.to(dtype = dtype)
+    if ontology == '':
+        dictionary, dict_sparse_embeds, dict_dense_embeds = cache_or_load_dictionary(biosyn, model_name_or_path)
+    else:
+        dictionary, dict_sparse_embeds, dict_dense_embeds = cache_or_load_dictionary_ontology(biosyn, model_name_or_path, ontology)
+    nbytes = model_nbytes(biosyn.encoder) + dict_sparse_embeds.nbytes + dict_dense_embeds.nbytes
+    return (biosyn, dictionary, dict_sparse_embeds, dict_dense_embeds), nbytes
+
+class _Entry:
+    __slots__ = ('value', 'nbytes')
+
+    def __init__(self, value, nbytes):
+        self.value = value
+        self.nbytes = nbytes
+
+class ModelRegistry:
+    """
+    Process-wide cache of the loaded DL models, so that each one is loaded once and then reused
+    by every call.
+
+    Entries are keyed by kind, model path, device and dtype (and, for BioSyn, the maximum name
+    length and the ontology its dictionary was embedded from). When ``max_bytes`` is set and
+    the models held take more memory than that, the models idle the longest are released
+    first; the model just requested is always kept. Models can be loaded ahead of the first
+    call with warmup() and dropped with release().
+    """
+
+    def __init__(self, max_bytes = None):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key -> _Entry, least recently used first
+        self.lock = threading.RLock()
+
+    def get(self, key, load):
+        """
+        The value cached under ``key``, loaded with ``load()`` (which returns the value and its
+        size in bytes) if it is not there yet.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = _Entry(*load())
+                self.entries[key] = entry
+            self.entries.move_to_end(key)
+            self._evict(key)
+            return entry.value
+
+    def ner(self, model_name = NER_MODEL, device = 'cpu', dtype = None):
+        """``(tokenizer, model)`` of the NER model, in evaluation mode on ``device``."""
+        device = torch.device(device)
+        return self.get(('ner', model_name, str(device), str(dtype)), lambda: _load_ner(model_name, device, dtype))
+
+    def biosyn(self, model_name_or_path = NEN_MODEL, device = 'cpu', dtype = None, max_length = 25, ontology = ''):
+        """
+        ``(biosyn, dictionary, dict_sparse_embeds, dict_dense_embeds)``: the BioSyn normaliser and
+        its dictionary (the microbELP one, or ``ontology``) with the names already embedded.
+        """
+        device = torch.device(device)
+        key = ('biosyn', model_name_or_path, str(device), str(dtype), max_length, ontology)
+        return self.get(key, lambda: _load_biosyn(model_name_or_path, device, dtype, max_length, ontology))
+
+    def warmup(self, device = 'cpu', normalisation = True, dtype = None, max_length = 25, ontology = ''):
+        """
+        Load the NER model, and the BioSyn normaliser if ``normalisation``, and run one short
+        input through them, so that the first real call pays neither for loading nor for the
+        first, slower, forward pass.
+        """
+        device = torch.device(device)
+        tokenizer, model = self.ner(device = device, dtype = dtype)
+        with torch.no_grad():
+            model(**tokenizer(['Escherichia coli'], return_tensors="pt").to(device))
+        if normalisation:
+            biosyn = self.biosyn(device = device, dtype = dtype, max_length = max_length, ontology = ontology)[0]
+            biosyn.embed_dense(names=['escherichia coli'])
+
+    def release(self, model_name = None):
+        """
+        Drop every cached model, or only those loaded from ``model_name``, and return how many
+        were dropped. Their memory is freed once the callers still using them are done.
+        """
+        with self.lock:
+            keys = [key for key in self.entries if model_name is None or key[1] == model_name]
+            for key in keys:
+                del self.entries[key]
+        if keys and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return len(keys)
+
+    @property
+    def nbytes(self):
+        """Memory held by the cached models, in bytes."""
+        return sum(entry.nbytes for entry in self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _evict(self, keep):
+        if self.max_bytes is None:
+            return
+        for key in list(self.entries):
+            if self.nbytes <= self.max_bytes:
+                break
+            if key != keep:
+                del self.entries[key]
+
+
+_model_registry = None
+
+def model_registry():
+    """
+    Return the process-wide ModelRegistry, created on first use.
+    """
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry()
+    return _model_registry
@@ -0,0 +1,57 @@
+from microbELP.tokenizer import normalise_token
+
+class NameTrie:
+    """
+    Token trie compiled from lexicon CleanNames.
+
+    Each node is a dict keyed by normalised token (lower-cased when ``fold`` is set);
+    the ``None`` key of a node holds the CleanName that ends there. ``find_all``
+    returns the leftmost-longest matches of a passage in one pass over its tokens.
+    """
+
+    def __init__(self, names, fold = False):
+        self.root = {}
+        self.depth = 0
+        self.fold = fold
+        for name in names:
+            tokens = [normalise_token(t) for t in name.split(" ")]
+            if fold:
+                tokens = [t.lower() for t in tokens]
+            node = self.root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(None, name)
+            self.depth = max(self.depth, len(tokens))
+
+    def longest_match(self, tokens, start):
+        """
+        Longest lexicon name starting at ``tokens[start]``.
+
+        Returns (end, name) where ``tokens[start:end]`` spells the name, or None.
+        """
+        node = self.root
+        found = None
+        for end in range(start, len(tokens)):
+            node = node.get(tokens[end])
+            if node is None:
+                break
+            if None in node:
+                found = (end + 1, node[None])
+        return found
+
+    def find_all(self, tokens, min_tokens = 1):
+        """
+        Non-overlapping leftmost-longest matches of at least ``min_tokens`` tokens.
+
+        Returns a dict mapping the start token index to (end, name).
+        """
+        matches = {}
+        start = 0
+        while start < len(tokens):
+            found = self.longest_match(tokens, start)
+            if found is not None and found[0] - start >= min_tokens:
+                matches[start] = found
+                start = found[0]
+            else:
+                start += 1
+        return matches
@@ -1,35 +1,155 @@
-import json
-from collections import Counter
-from microbELP.load_dic import load_dic
+import numpy as np
+import pandas as pd
+from microbELP.lexicon_index import load_lexicon_index
+from microbELP.fuzzy_index import FuzzyIndex
 
-def microbiome_normalisation(word):
+class Normaliser:
+    """
+    Rule-based normaliser of microbiome mentions to NCBI Taxonomy identifiers.
 
-    # Most up to date version of this dictionary. 
-    dict_data = load_dic()
-    CleanNames = [i['CleanName'].lower() for i in dict_data]
+    The lexicon index is loaded once, when the normaliser is created, and each mention is then
+    resolved with a single dict lookup on its lower-cased name. Keep one instance to normalise
+    many mentions.
 
-    #Used to produce the strains dictionary for duplicate taxa where clean names have multiple mentions. 
-    cncounts = dict(Counter(CleanNames))
-    strains = {key:value for key, value in cncounts.items() if value > 1}
-    CleanNames =list(dict.fromkeys(CleanNames))
-    lcCleanNames = [i['CleanName'].lower() for i in dict_data]
+    Parameters
+    ----------
+    lexicon : LexiconIndex
+        lexicon to normalise with, by default the one returned by load_lexicon_index()
+    all_candidates : bool
+        if True, return the list of every TaxID registered under an ambiguous name (strains,
+        homonyms) instead of the first one
+    max_distance : int
+        largest number of edits (see fuzzy()) between a mention and the lexicon names it matches
+    """
 
-    if type(word) == str:
-        if word.lower() in CleanNames: # Adjust to lcCleanNames if only using lower case values
-            match = next((l for l in dict_data if l['CleanName'].lower() == word.lower()), None)
-            normalised_identifier = match["TaxID"]
-            return normalised_identifier
-        else:
+    def __init__(self, lexicon = None, all_candidates = False, max_distance = 2):
+        self.lexicon = load_lexicon_index() if lexicon is None else lexicon
+        self.all_candidates = all_candidates
+        self.max_distance = max_distance
+        self._fuzzy_index = None
+
+    def normalise(self, word, all_candidates = None):
+        """
+        TaxID of one mention, or None if it is not in the lexicon. With ``all_candidates`` (by
+        default the normaliser's setting), the list of every matching TaxID, in lexicon order.
+        """
+        group = self.lexicon.by_lc_name.get(word.lower())
+        if not group:
             return None
+        if self.all_candidates if all_candidates is None else all_candidates:
+            return list(dict.fromkeys(e['TaxID'] for e in group))
+        return group[0]['TaxID']
+
+    __call__ = normalise
+
+    def normalise_iter(self, words, all_candidates = None):
+        """
+        Generator of ``(mention, TaxID)`` pairs, for streams of mentions too large to hold in memory.
+        """
+        for word in words:
+            yield word, self.normalise(word, all_candidates)
+
+    def normalise_batch(self, words, all_candidates = None):
+        """
+        List of ``{mention: TaxID}`` dicts, one per mention, in the order given.
+        """
+        return [{word: identifier} for word, identifier in self.normalise_iter(words, all_candidates)]
+
+    def normalise_array(self, mentions, all_candidates = None):
+        """
+        TaxIDs of a column of mentions (pandas Series, NumPy array or list), aligned with it: a
+        Series with the same index for a Series, an object array otherwise, with None for the
+        mentions not in the lexicon and for missing values.
+
+        The mentions are factorised first, so each distinct mention is resolved once and the
+        cost grows with the number of distinct mentions rather than with the number of rows.
+        """
+        codes, uniques = pd.factorize(mentions)
+        # One extra slot for the code -1 that pd.factorize gives missing values
+        resolved = np.full(len(uniques) + 1, None, dtype = object)
+        for k, mention in enumerate(uniques):
+            if isinstance(mention, str):
+                resolved[k] = self.normalise(mention, all_candidates)
+        identifiers = resolved[codes]
+        if isinstance(mentions, pd.Series):
+            return pd.Series(identifiers, index = mentions.index, name = mentions.name)
+        return identifiers
+
+    @property
+    def fuzzy_index(self):
+        """FuzzyIndex of the lexicon names, built on first use."""
+        if self._fuzzy_index is None:
+            self._fuzzy_index = FuzzyIndex(self.lexicon, self.max_distance)
+        return self._fuzzy_index
+
+    def fuzzy(self, word, candidates_number = 5):
+        """
+        Typo-tolerant normalisation of one mention, in the format of
+        microbiome_biosyn_normalisation(): ``{'mention': word, 'candidates': [{TaxID: CleanName}, ...]}``
+        with up to ``candidates_number`` lexicon entries whose name is within ``max_distance``
+        edits (insertions, deletions, substitutions, adjacent transpositions, ignoring case) of
+        the mention, closest first.
+        """
+        candidates = []
+        seen = set()
+        for _, name in self.fuzzy_index.lookup(word):
+            for entry in self.lexicon.by_lc_name[name]:
+                key = (entry['TaxID'], entry['CleanName'])
+                if key not in seen:
+                    seen.add(key)
+                    candidates.append({entry['TaxID']: entry['CleanName']})
+            if len(candidates) >= candidates_number:
+                break
+        return {'mention': word, 'candidates': candidates[:candidates_number]}
+
+
+_default_normalisers = {}
+
+def default_normaliser(max_distance = 2):
+    """
+    Normaliser shared by the whole process (one per ``max_distance``), created on first use.
+    """
+    if max_distance not in _default_normalisers:
+        _default_normalisers[max_distance] = Normaliser(max_distance = max_distance)
+    return _default_normalisers[max_distance]
+
+def microbiome_fuzzy_normalisation(to_normalise, candidates_number = 5, max_distance = 2):
+    if not isinstance(to_normalise, (str, list)):
+        print('Parameter "to_normalise": Input error, this function only accepts a string or list of strings representing microbiome entities to be normalised.')
+        return None
+    else:
+        pass
+    if type(candidates_number) != int or candidates_number < 1:
+        print('Parameter "candidates_number": Input error, this function only accepts a positive integer indicating the number of candidates to return for each mention.')
+        return None
+    else:
+        pass
+    if type(max_distance) != int or max_distance < 0:
+        print('Parameter "max_distance": Input error, this function only accepts a non-negative integer, the largest number of edits between a mention and the lexicon names it matches.')
+        return None
+    else:
+        pass
+    if type(to_normalise) == str:
+        to_normalise = [to_normalise]
+    normaliser = default_normaliser(max_distance)
+    return [normaliser.fuzzy(mention, candidates_number) for mention in to_normalise]
+
+def microbiome_batch_normalisation(mentions, all_candidates = False):
+    if not isinstance(mentions, (pd.Series, np.ndarray, list)):
+        print('Parameter "mentions": Input error, this function only accepts a pandas Series, a NumPy array or a list of microbiome mentions to normalise.')
+        return None
+    else:
+        pass
+    return default_normaliser().normalise_array(mentions, all_candidates)
+
+def microbiome_normalisation(word, all_candidates = False):
+
+    # Most up to date version of this dictionary, compiled once and shared by the whole process.
+    normaliser = default_normaliser()
+
+    if type(word) == str:
+        return normaliser.normalise(word, all_candidates)
     elif type(word) == list:
-        output_list = []
-        for i in range(len(word)):
-            if word[i].lower() in CleanNames: # Adjust to lcCleanNames if only using lower case values
-                match = next((l for l in dict_data if l['CleanName'].lower() == word[i].lower()), None)
-                normalised_identifier = match["TaxID"]
-                output_list.append({word[i]: normalised_identifier})
-            else:
-                output_list.append({word[i]: None})
-        return output_list
+        return normaliser.normalise_batch(word, all_candidates)
     else:
         return 'Input error, this function only accepts one "str" microbiome mention to normalise or a list of "str" microbiome mentions to normalise has input.'
@@ -6,18 +6,79 @@ sys.stderr = io.StringIO()
 import PySimpleGUI as sg
 sys.stdout = _stdout
 sys.stderr = _stderr
+import os
+import gc
 import glob
+import time
+import json
 import multiprocessing as mp
 from datetime import datetime
-from microbELP.load_dic import load_dic
+from microbELP.lexicon_index import load_lexicon_index, lexicon_artifact_path, init_worker_lexicon
 from microbELP.parallel_microbiomeAnnotator_condensed import parallel_Annotator as ann
+from microbELP.annotation_engine import AnnotationEngine
+from microbELP.bioc_io import write_bioc, bioc_done_name
+from microbELP.run_ledger import RunLedger, count_annotations
+from microbELP.passage_cache import PassageCache
 
-def run_ann_initialsteps(input_dir, output_dir, count, keyword, casesens, process_number):
-    obj = ann(input_dir, output_dir, count, keyword, casesens, process_number)
-    obj.initialsteps()  # call the method on the instance
-    return True
+# Passage cache of this pool worker, opened once by init_worker() and used for all its files
+_worker_cache = None
 
-def parallel_microbELP(input_directory, numbers_of_cores, output_directory = './', count = 0, keyword = 'ALL', casesens = 'no'):
+def init_worker(lexicon_path, lexicon_version, cache_size):
+    global _worker_cache
+    init_worker_lexicon(lexicon_path, lexicon_version)
+    _worker_cache = PassageCache(max_entries = cache_size) if cache_size > 0 else None
+
+def run_ann_file(task):
+    # One pool task = one BioC file, so idle workers always pick up the next pending file
+    in_file, output_dir, count, keyword, casesens, compact, compress, cache_size, sha1 = task
+    worker = mp.current_process().name
+    start = time.perf_counter()
+    obj = ann([in_file], output_dir, count, keyword, casesens, worker, compact, compress, cache_size, passage_cache = _worker_cache, known_hashes = {in_file: sha1} if sha1 is not None else None)
+    obj.initialsteps()
+    return worker, in_file, os.path.getsize(in_file), time.perf_counter() - start
+
+def run_ann_chunk(task):
+    # One pool task = one chunk of the passages of a split file, see annotate_split_file()
+    passages, keyword, casesens = task
+    return AnnotationEngine(keyword, casesens).annotate_detached(passages)
+
+def annotate_split_file(pool, par_core, in_file, result_directory, count, keyword, casesens, compact, compress, ledger):
+    # The passages of the file are annotated in chunks by every worker, then replayed in order here,
+    # so annotation IDs and abbreviations resolved from earlier taxa come out as in a single pass
+    start = time.perf_counter()
+    with open(in_file, encoding = 'utf-8') as f:
+        data = json.load(f)
+    passages = [para for document in data['documents'] for para in document['passages']]
+    chunk_size = max(1, -(-len(passages) // (par_core * 4)))
+    chunks = [passages[k:k + chunk_size] for k in range(0, len(passages), chunk_size)]
+    print(f'Splitting {in_file} into {len(chunks)} chunks of up to {chunk_size} passages.')
+    entries = []
+    for chunk_entries in pool.imap(run_ann_chunk, [(chunk, keyword, casesens) for chunk in chunks]):
+        entries.extend(chunk_entries)
+    engine = AnnotationEngine(keyword, casesens, count)
+    strains = engine.start_run()
+    done = 0
+    for document in data['documents']:
+        n = len(document['passages'])
+        taxa_per_file = engine.reconcile_document(document, entries[done:done + n], 0, strains)
+        done += n
+        print(f'Finished annotating file {in_file} and found the following list of entities: ', taxa_per_file)
+    output_file = write_bioc(data, result_directory + '/' + os.path.basename(in_file), compact = compact, compress = compress)
+    duration = time.perf_counter() - start
+    ledger.record(in_file, engine.lexicon.version, 'done', duration, count_annotations(data), os.path.basename(output_file))
+    return mp.current_process().name, in_file, os.path.getsize(in_file), duration
+
+def report_worker_throughput(stats, wall_time):
+    per_worker = {}
+    for worker, in_file, size, duration in stats:
+        files, total_size, busy = per_worker.get(worker, (0, 0, 0.0))
+        per_worker[worker] = (files + 1, total_size + size, busy + duration)
+    for worker in sorted(per_worker):
+        files, total_size, busy = per_worker[worker]
+        rate = files / busy if busy > 0 else 0.0
+        print(f'{worker}: {files} file(s), {total_size / 1e6:.2f} MB, busy {busy:.1f}s ({rate:.2f} files/s, {100 * busy / wall_time if wall_time > 0 else 0:.0f}% of wall time)')
+
+def parallel_microbELP(input_directory, numbers_of_cores, output_directory = './', count = 0, keyword = 'ALL', casesens = 'no', maxtasksperchild = None, compact = False, compress = False, cache_size = 0, split_mb = None):
     if type(input_directory) != str:
         print('Parameter "input_directory": Input error, this function only accepts a string directory with BioC files to be annotated with "*_bioc.json", e.g. for "./bioc/*_bioc.json", requires "./bioc" as input.')
         return None
@@ -33,6 +94,26 @@ def parallel_microbELP(input_directory, numbers_of_cores, output_directory = './
         return None
     else:
         pass
+    if maxtasksperchild is not None and (type(maxtasksperchild) != int or maxtasksperchild < 1):
+        print('Parameter "maxtasksperchild": Input error, this function only accepts None or a positive int, the number of files a worker annotates before it is replaced by a fresh process.')
+        return None
+    else:
+        pass
+    if type(compact) != bool or type(compress) != bool:
+        print('Parameters "compact" and "compress": Input error, these parameters only accept a boolean. "compact" writes the output without indentation, "compress" writes it gzip-compressed as "*_bioc.json.gz".')
+        return None
+    else:
+        pass
+    if type(cache_size) != int or cache_size < 0:
+        print('Parameter "cache_size": Input error, this parameter only accepts a non-negative int, the maximum number of passages kept in the persistent passage cache ("0" disables the cache).')
+        return None
+    else:
+        pass
+    if split_mb is not None and (type(split_mb) not in (int, float) or split_mb <= 0):
+        print('Parameter "split_mb": Input error, this parameter only accepts None or a positive number, files of at least this many megabytes have their passages annotated by all the workers together.')
+        return None
+    else:
+        pass
     if numbers_of_cores >= mp.cpu_count():
         print('The number of cores you want to use is equal or greater than the numbers of cores in your machine. We stop the script now')
         return None
@@ -43,39 +124,44 @@ def parallel_microbELP(input_directory, numbers_of_cores, output_directory = './
     else:
         input_bioc = glob.glob(input_directory + '/*_bioc.json')
     if output_directory[-1] == '/':
-        done = glob.glob(output_directory + 'microbELP_result' + '/*_bioc.json')
+        result_directory = output_directory + 'microbELP_result'
     else:
-        done = glob.glob(output_directory + '/microbELP_result' + '/*_bioc.json')
-    final_input_bioc = []
-    for i in range(len(done)):
-        done[i] = done[i].split('/')[-1]
-    for i in range(len(input_bioc)):
-        if input_bioc[i].split('/')[-1] not in done:
-            final_input_bioc.append(input_bioc[i])
-    if len(final_input_bioc) < par_core:
+        result_directory = output_directory + '/microbELP_result'
+    done = {bioc_done_name(f.split('/')[-1]) for f in glob.glob(result_directory + '/*_bioc.json*')}
+    # The lexicon is built once here. Forked workers inherit it copy-on-write (gc.freeze keeps the
+    # collector from touching, and so copying, its pages); spawned workers each load a copy from the compiled artifact.
+    lexicon = load_lexicon_index()
+    # Inputs already annotated with this lexicon and unchanged since are skipped, see RunLedger
+    ledger = RunLedger(result_directory)
+    final_input_bioc = ledger.pending(input_bioc, lexicon.version, done)
+    # Files this large are split by passage across the workers instead of going to a single one
+    split_files = [f for f in final_input_bioc if split_mb is not None and os.path.getsize(f) >= split_mb * 1e6]
+    if len(split_files) == 0 and len(final_input_bioc) < par_core:
         par_core = len(final_input_bioc)
     if len(final_input_bioc) == 0:
         print('No new document to annotate.')
         return None
-    if par_core > 1:
-        data = []
-        for i in range(par_core):
-            if i == 0:
-                current_data = (final_input_bioc[:round(len(final_input_bioc)/par_core)], output_directory, count, keyword, casesens, i+1)
-                data.append(current_data)
-            elif i > 0 and i+1 != par_core:
-                current_data = (final_input_bioc[(round(len(final_input_bioc)/par_core))*i:(round(len(final_input_bioc)/par_core))*(i+1)], output_directory, count, keyword, casesens, i+1)
-                data.append(current_data)
-            else:
-                current_data = (final_input_bioc[round(len(final_input_bioc)/par_core)*i:], output_directory, count, keyword, casesens, i+1)
-                data.append(current_data)
-    else:
-        data = [(final_input_bioc, output_directory, count, keyword, casesens, 1)]
+    # Largest files first, so a big review started last cannot hold up the end of the run
+    final_input_bioc.sort(key = os.path.getsize, reverse = True)
+    # Hashes computed while resuming are passed on, so workers do not read those files twice
+    tasks = [(in_file, output_directory, count, keyword, casesens, compact, compress, cache_size, ledger.known_hash(in_file)) for in_file in final_input_bioc if in_file not in split_files]
     now = datetime.now()
     current_time = now.strftime("%d/%m/%Y, %H:%M:%S")
     print(str(current_time) + str(' Process starting'))
-    with mp.Pool(par_core) as pool:
-        pool.starmap(run_ann_initialsteps, data)
+    start = time.perf_counter()
+    gc.freeze()
+    stats = []
+    try:
+        with mp.Pool(par_core, initializer = init_worker, initargs = (lexicon_artifact_path(), lexicon.version, cache_size), maxtasksperchild = maxtasksperchild) as pool:
+            if len(split_files) > 0:
+                os.makedirs(result_directory, exist_ok = True)
+            for in_file in split_files:
+                stats.append(annotate_split_file(pool, par_core, in_file, result_directory, count, keyword, casesens, compact, compress, ledger))
+            for result in pool.imap_unordered(run_ann_file, tasks):
+                stats.append(result)
+    finally:
+        gc.unfreeze()
+    report_worker_throughput(stats, time.perf_counter() - start)
     now = datetime.now()
     current_time = now.strftime("%d/%m/%Y, %H:%M:%S")
     print(str(current_time) + str(' Process complete'))
@@ -0,0 +1,125 @@
+import os
+import gc
+import glob
+import time
+import multiprocessing as mp
+from datetime import datetime
+import torch
+from microbELP.bioc_io import write_bioc, bioc_done_name
+from microbELP.run_ledger import RunLedger, count_annotations
+from microbELP.dl_batching import WindowBatcher, batched_bioc_files
+from microbELP.model_registry import model_registry, NER_MODEL, NEN_MODEL
+from microbELP.microbELP_DL import add_dl_annotations
+from microbELP.parallel_microbELP import report_worker_throughput
+
+def init_dl_worker(threads):
+    # Each worker gets its share of the cores instead of one PyTorch thread per core, which
+    # would oversubscribe the machine as soon as several workers run a forward pass together
+    torch.set_num_threads(threads)
+
+def run_dl_file(task):
+    # One pool task = one BioC file. The models come from the worker's ModelRegistry: inherited
+    # from the parent when the worker was forked, loaded on the first file otherwise
+    in_file, output_directory, normalisation, batch_size, compact, compress = task
+    worker = mp.current_process().name
+    start = time.perf_counter()
+    device = torch.device("cpu")
+    tokenizer, model = model_registry().ner(NER_MODEL, device = device)
+    nen_models = model_registry().biosyn(NEN_MODEL, device = device) if normalisation else None
+    batcher = WindowBatcher(tokenizer, model, device, batch_size)
+    for _, d, texts, passage_spans, _ in batched_bioc_files(batcher, [in_file]):
+        add_dl_annotations(d, texts, passage_spans, nen_models)
+    output_file = write_bioc(d, f'{output_directory}{in_file.split("/")[-1]}', compact = compact, compress = compress, indent = 2, ensure_ascii = False)
+    return worker, in_file, os.path.getsize(in_file), time.perf_counter() - start, count_annotations(d), os.path.basename(output_file)
+
+def parallel_microbELP_DL(input_directory, numbers_of_cores, output_dir = './', normalisation = True, threads_per_worker = None, batch_size = 32, compact = False, compress = False):
+    if type(input_directory) != str:
+        print('Parameter "input_directory": Input error, this function only accepts a string directory with BioC files to be annotated with "*_bioc.json", e.g. for "./bioc/*_bioc.json", requires "./bioc" as input.')
+        return None
+    else:
+        pass
+    if type(output_dir) != str:
+        print('Parameter "output_dir": Input error, this function only accepts a string directory to save the annotated files, e.g. for "./bioc_annotated/", the function will generate and save the output in "./bioc_annotated/microbELP_DL_result/".')
+        return None
+    else:
+        pass
+    if type(numbers_of_cores) != int or numbers_of_cores < 1:
+        print('Parameter "numbers_of_cores": Input error, this function only accepts a positive int, it will start the equivalent number of worker processes.')
+        return None
+    else:
+        pass
+    if type(normalisation) != bool:
+        print('Parameter "normalisation": Input error, this function only accepts "True" or "False", if "True", the entities are normalised and added to the annotations.')
+        return None
+    else:
+        pass
+    if threads_per_worker is not None and (type(threads_per_worker) != int or threads_per_worker < 1):
+        print('Parameter "threads_per_worker": Input error, this parameter only accepts None or a positive int, the number of PyTorch threads each worker uses (by default, the cores of the machine divided between the workers).')
+        return None
+    else:
+        pass
+    if type(batch_size) != int or batch_size < 1:
+        print('Parameter "batch_size": Input error, this parameter only accepts a positive integer, the number of text windows the NER model annotates per forward pass.')
+        return None
+    else:
+        pass
+    if type(compact) != bool or type(compress) != bool:
+        print('Parameters "compact" and "compress": Input error, these parameters only accept a boolean. "compact" writes the output without indentation, "compress" writes it gzip-compressed as "*_bioc.json.gz".')
+        return None
+    else:
+        pass
+    if numbers_of_cores >= mp.cpu_count():
+        print('The number of cores you want to use is equal or greater than the numbers of cores in your machine. We stop the script now')
+        return None
+    else:
+        par_core = numbers_of_cores
+    if threads_per_worker is None:
+        threads_per_worker = max(1, mp.cpu_count() // par_core)
+    if input_directory[-1] == '/':
+        input_list = glob.glob(input_directory + '*_bioc.json')
+    else:
+        input_list = glob.glob(input_directory + '/*_bioc.json')
+    if output_dir[-1] == '/':
+        output_directory = output_dir + 'microbELP_DL_result/'
+    else:
+        output_directory = output_dir + '/microbELP_DL_result/'
+    os.makedirs(output_directory, exist_ok = True)
+    done = {bioc_done_name(f.split('/')[-1]) for f in glob.glob(output_directory + '*_bioc.json*')}
+    # Same output directory, model version and ledger as microbELP_DL, so either can resume the other's run
+    model_version = NER_MODEL + ('|' + NEN_MODEL if normalisation else '')
+    ledger = RunLedger(output_directory)
+    final_input_bioc = ledger.pending(input_list, model_version, done)
+    if len(final_input_bioc) == 0:
+        print('No new document to annotate.')
+        return None
+    if len(final_input_bioc) < par_core:
+        par_core = len(final_input_bioc)
+    print(f'Running the code using the CPU: {par_core} worker(s) with {threads_per_worker} thread(s) each.')
+    # Largest files first, so a big review started last cannot hold up the end of the run
+    final_input_bioc.sort(key = os.path.getsize, reverse = True)
+    if mp.get_start_method() == 'fork':
+        # The models are loaded once here and forked workers share their weights copy-on-write
+        # (gc.freeze keeps the collector from touching, and so copying, their pages); workers
+        # started otherwise load their own copy on their first file
+        model_registry().ner(NER_MODEL, device = 'cpu')
+        if normalisation:
+            model_registry().biosyn(NEN_MODEL, device = 'cpu')
+    tasks = [(in_file, output_directory, normalisation, batch_size, compact, compress) for in_file in final_input_bioc]
+    now = datetime.now()
+    current_time = now.strftime("%d/%m/%Y, %H:%M:%S")
+    print(str(current_time) + str(' Process starting'))
+    start = time.perf_counter()
+    gc.freeze()
+    stats = []
+    try:
+        with mp.Pool(par_core, initializer = init_dl_worker, initargs = (threads_per_worker,)) as pool:
+            for z, (worker, in_file, size, duration, annotations, output_file) in enumerate(pool.imap_unordered(run_dl_file, tasks)):
+                print(f'Processed file {z+1} out of {len(tasks)}.')
+                ledger.record(in_file, model_version, 'done', duration, annotations, output_file)
+                stats.append((worker, in_file, size, duration))
+    finally:
+        gc.unfreeze()
+    report_worker_throughput(stats, time.perf_counter() - start)
+    now = datetime.now()
+    current_time = now.strftime("%d/%m/%Y, %H:%M:%S")
+    print(str(current_time) + str(' Process complete'))
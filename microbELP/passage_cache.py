@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from microbELP.lexicon_index import lexicon_cache_dir
+
+# Bump whenever the stored annotation layout or the annotation rules change so old entries are ignored
+PASSAGE_CACHE_FORMAT_VERSION = 2
+# Buffered writes are committed, in one transaction, every this many cache operations
+_FLUSH_EVERY = 1000
+
+def passage_cache_path():
+    """
+    Path of the persistent passage cache, next to the compiled lexicon (see lexicon_cache_dir()).
+    """
+    return os.path.join(lexicon_cache_dir(), 'passage_cache.sqlite')
+
+class PassageCache:
+    """
+    Persistent, content-addressed cache of passage annotations, kept in an SQLite file.
+
+    Entries are keyed by the hash of the passage text and of the annotation settings (lexicon
+    version, case policy, boundary rules), and hold the annotations with offsets relative to the
+    passage, so a passage repeated verbatim (licence statements, funding boilerplate, shared
+    captions) is annotated by a lookup wherever it appears. At most ``max_entries`` entries are
+    kept; the least recently used ones are evicted first.
+
+    New entries and the last-use times of the entries read are buffered, and written in one
+    transaction every 1000 operations and on flush() or close(), so a cold run does not pay for
+    one commit per passage; the size bound is enforced in the same transaction. Several processes can share one cache file. The cache never fails an
+    annotation run: a database error is a miss on read and is ignored on write.
+    """
+
+    def __init__(self, path = None, max_entries = 100000):
+        self.path = passage_cache_path() if path is None else path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = {}         # key -> (serialised value, time stored), not written yet
+        self._used = {}         # key -> last use, not written yet
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+        self.conn = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+        try:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.Error:
+            pass
+        self.conn.execute('CREATE TABLE IF NOT EXISTS passages (key TEXT PRIMARY KEY, value TEXT NOT NULL, used INTEGER NOT NULL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS passages_used ON passages (used)')
+
+    @staticmethod
+    def key(text, settings):
+        """Cache key of a passage text annotated with ``settings``."""
+        h = hashlib.sha1(f'{PASSAGE_CACHE_FORMAT_VERSION}|{settings}\n'.encode())
+        h.update(text.encode('utf-8', 'surrogatepass'))
+        return h.hexdigest()
+
+    def get(self, key):
+        """The entry stored under ``key``, marked as just used, or None."""
+        if key in self._puts:
+            value = self._puts[key][0]
+        else:
+            try:
+                row = self.conn.execute('SELECT value FROM passages WHERE key = ?', (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            value = row[0]
+        self._used[key] = time.time_ns()
+        self._maybe_flush()
+        self.hits += 1
+        return json.loads(value)
+
+    def put(self, key, value):
+        """Store the JSON-serialisable ``value`` under ``key``."""
+        self._puts[key] = (json.dumps(value, ensure_ascii = False), time.time_ns())
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._puts) + len(self._used) >= _FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered entries and last-use times, in one transaction."""
+        if not self._puts and not self._used:
+            return
+        puts, used = self._puts, self._used
+        self._puts, self._used = {}, {}
+        try:
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.executemany('INSERT OR REPLACE INTO passages (key, value, used) VALUES (?, ?, ?)', [(key, value, t) for key, (value, t) in puts.items()])
+                self.conn.executemany('UPDATE passages SET used = ? WHERE key = ?', [(t, key) for key, t in used.items()])
+                if puts:
+                    self.evict()
+                self.conn.execute('COMMIT')
+            except sqlite3.Error:
+                self.conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            pass
+
+    def evict(self):
+        """Delete the least recently used entries beyond ``max_entries`` (oldest rows first on ties)."""
+        self.conn.execute(
+            'DELETE FROM passages WHERE key IN (SELECT key FROM passages ORDER BY used ASC, rowid ASC '
+            'LIMIT max(0, (SELECT COUNT(*) FROM passages) - ?))',
+            (self.max_entries,)
+        )
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM passages').fetchone()[0]
+
+    def close(self):
+        self.flush()
+        try:
+            self.evict()
+        except sqlite3.Error:
+            pass
+        self.conn.close()
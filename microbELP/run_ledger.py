@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+LEDGER_NAME = 'microbELP_ledger.jsonl'
+
+def file_sha1(path, chunk_size = 1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class RunLedger:
+    """
+    Append-only JSONL ledger kept in an output directory, one line per annotated input:
+    file name, content hash, size/mtime, lexicon or model version, status, duration and number
+    of annotations. The last line written for an input is its current state.
+
+    Resuming is a dict lookup per input, and an input is annotated again when its content or
+    the lexicon/model version has changed since it was recorded. Lines are appended with a
+    single write on a file opened in append mode, so pool workers can share one ledger: with
+    ``load = False`` the existing lines are not read, for workers that only record().
+    """
+
+    def __init__(self, directory, filename = LEDGER_NAME, load = True):
+        self.path = os.path.join(directory, filename)
+        self.records = {}
+        self._hashes = {}
+        if load and os.path.isfile(self.path):
+            with open(self.path, encoding = 'utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash: the input it describes is simply redone
+                        continue
+                    self.records[record['input']] = record
+
+    def file_hash(self, path):
+        """
+        Content hash of ``path``. Files whose size and mtime match their ledger record reuse the
+        recorded hash instead of being read again.
+        """
+        if path in self._hashes:
+            return self._hashes[path]
+        st = os.stat(path)
+        record = self.records.get(os.path.basename(path))
+        if record is not None and record.get('size') == st.st_size and record.get('mtime_ns') == st.st_mtime_ns:
+            digest = record['sha1']
+        else:
+            digest = file_sha1(path)
+        self._hashes[path] = digest
+        return digest
+
+    def known_hash(self, path):
+        """Content hash of ``path`` if it was already computed or read from the ledger, else None."""
+        return self._hashes.get(path)
+
+    def is_done(self, path, version):
+        record = self.records.get(os.path.basename(path))
+        if record is None or record.get('status') != 'done' or record.get('version') != version:
+            return False
+        return record.get('sha1') == self.file_hash(path)
+
+    def pending(self, paths, version, done_outputs = ()):
+        """
+        Inputs of ``paths`` still to annotate with ``version``.
+
+        ``done_outputs`` holds the input names that have an output file. It is only trusted for
+        inputs the ledger has never seen, i.e. outputs written before the ledger existed.
+        """
+        done_outputs = set(done_outputs)
+        to_do = []
+        for path in paths:
+            name = os.path.basename(path)
+            if name not in self.records:
+                if name not in done_outputs:
+                    to_do.append(path)
+            elif not self.is_done(path, version):
+                to_do.append(path)
+        return to_do
+
+    def record(self, path, version, status = 'done', duration = None, annotations = None, output = None, sha1 = None):
+        # ``sha1``: content hash of ``path`` already computed by the caller, e.g. the parent process
+        if sha1 is not None:
+            self._hashes[path] = sha1
+        st = os.stat(path)
+        record = {
+            'input': os.path.basename(path),
+            'sha1': self.file_hash(path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'version': version,
+            'status': status,
+            'duration': None if duration is None else round(duration, 3),
+            'annotations': annotations,
+            'output': output,
+            'date': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        line = json.dumps(record, ensure_ascii = False) + '\n'
+        with open(self.path, 'a', encoding = 'utf-8') as f:
+            f.write(line)
+        self.records[record['input']] = record
+        return record
+
+def count_annotations(data):
+    return sum(len(passage.get('annotations', [])) for document in data['documents'] for passage in document['passages'])
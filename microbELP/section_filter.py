@@ -0,0 +1,71 @@
+import re
+
+_IAO_ID = re.compile(r'^IAO:\w+$')
+
+def _variants(keyword):
+    # Matched with its first letter in upper or lower case: 'results' also selects 'Results'
+    return {keyword[0].upper() + keyword[1:], keyword[0].lower() + keyword[1:]}
+
+def section_name(infons):
+    """
+    Name of the section a passage belongs to, used to report skipped text.
+    """
+    for key in ('iao_name_1', 'section_title_1', 'section', 'type'):
+        v = infons.get(key)
+        if isinstance(v, str) and v != '':
+            return v
+    return 'unknown'
+
+class SectionFilter:
+    """
+    Passage filter compiled once from the section keywords and IAO IDs to annotate.
+
+    ``keywords`` is 'ALL' (every passage), one keyword such as 'results' or 'IAO:0000318', or a
+    collection of them. A passage is selected when one of its infons values, or one of the words
+    of such a value, is a keyword (first letter in either case) or an IAO ID. Checking a passage
+    is a set lookup per infons value; passages that are not selected are counted per section in
+    ``skipped`` as [passages, characters] until reset() is called.
+    """
+
+    def __init__(self, keywords = 'ALL'):
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        keywords = [str(k) for k in keywords if str(k) != '']
+        self.select_all = 'ALL' in keywords
+        self.iao_ids = frozenset(k for k in keywords if _IAO_ID.match(k))
+        self.terms = frozenset(v for k in keywords if k not in self.iao_ids for v in _variants(k)) | self.iao_ids
+        self.skipped = {}
+
+    def reset(self):
+        self.skipped = {}
+
+    def selects(self, infons):
+        """
+        Whether a passage with these infons is to be annotated.
+        """
+        if self.select_all:
+            return True
+        terms = self.terms
+        for v in infons.values():
+            if not isinstance(v, str):
+                continue
+            elif v in terms or not terms.isdisjoint(v.split(" ")):
+                return True
+        return False
+
+    def __call__(self, para):
+        """
+        Whether the passage ``para`` is to be annotated; if not, it is counted in ``skipped``.
+        """
+        if self.selects(para['infons']):
+            return True
+        counts = self.skipped.setdefault(section_name(para['infons']), [0, 0])
+        counts[0] += 1
+        counts[1] += len(para['text'])
+        return False
+
+    def summary(self):
+        """
+        One line per skipped section: passages and characters skipped.
+        """
+        return "\n".join(f"{name}: {n} passages, {c} characters" for name, (n, c) in sorted(self.skipped.items(), key = lambda e: -e[1][1]))
@@ -0,0 +1,47 @@
+import re
+
+# Tokens are maximal runs of non-whitespace: tabs, newlines and repeated spaces all separate words
+_TOKEN = re.compile(r'\S+')
+_DROP_BRACKETS = str.maketrans('', '', '()')
+_DROP_PUNCTUATION = str.maketrans('', '', '.,')
+_DROP_DOTS = str.maketrans('', '', '.')
+
+def normalise_token(word):
+    """
+    Normalised form of a word as matched against the lexicon: brackets are dropped, and
+    '.' / ',' are dropped except in abbreviated genera such as 'E.' (a two-character word
+    keeps its ',').
+    """
+    word = word.translate(_DROP_BRACKETS)
+    if len(word) != 2:
+        return word.translate(_DROP_PUNCTUATION)
+    elif word[0].isupper() and word[1] == '.':
+        return word
+    else:
+        return word.translate(_DROP_DOTS)
+
+def latin_variant(word):
+    """
+    Singular form of a Latin plural ('Rhizobii' -> 'Rhizobius', 'Bacteroidaceae' -> 'Bacteroidacea',
+    'Bacteria' -> 'Bacterium'), or '' when the word has none of these endings.
+    """
+    if word.endswith('ae'):
+        return word[:-2] + 'a'
+    elif word.endswith('i'):
+        return word[:-1] + 'us'
+    elif word.endswith('a'):
+        return word[:-1] + 'um'
+    return ''
+
+def tokenize(text):
+    """
+    Split a passage into word spans in one regex pass.
+
+    Returns a list of (start, end, normalised form, Latin variant) tuples, where ``text[start:end]``
+    is the word as written.
+    """
+    tokens = []
+    for m in _TOKEN.finditer(text):
+        word = normalise_token(m.group())
+        tokens.append((m.start(), m.end(), word, latin_variant(word)))
+    return tokens
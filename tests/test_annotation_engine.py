@@ -0,0 +1,45 @@
+import pytest
+from microbELP.lexicon_index import LexiconIndex
+from microbELP.annotation_engine import AnnotationEngine
+
+def entry(name, taxid, rank = 'species', parent = 'NCBI:txid1'):
+    return {'CleanName': name, 'TaxID': taxid, 'ParentTaxID': parent, 'KingdomID': 'NCBI:txid2', 'TaxRank': rank}
+
+LEXICON = LexiconIndex([
+    entry('Lactobacillus', 'NCBI:txid1578', 'genus'),
+    entry('Lactobacillus sp. ABC', 'NCBI:txid9001', 'strain', 'NCBI:txid1578'),
+    entry('Salmonella', 'NCBI:txid590', 'genus'),
+    entry('Salmonella enterica', 'NCBI:txid28901', 'species', 'NCBI:txid590'),
+    entry('Salmonella enterica subsp. enterica serovar Typhimurium', 'NCBI:txid90371', 'serotype', 'NCBI:txid28901'),
+    entry('Bacillus cereus str. X1', 'NCBI:txid7001', 'strain'),
+    entry('Bacillus cereus str. X1', 'NCBI:txid7002', 'strain'),
+])
+
+def annotate(text, casesens = 'no'):
+    return AnnotationEngine(casesens = casesens, lexicon = LEXICON).annotate_text(text)
+
+@pytest.mark.parametrize('casesens', ['no', 'YES'])
+@pytest.mark.parametrize('name', [
+    'Lactobacillus sp.',                                          # per-word path
+    'Lactobacillus sp. ABC',                                      # token trie
+    'Salmonella enterica subsp. enterica serovar Typhimurium',    # token trie
+])
+def test_dotted_names_keep_passage_offsets(name, casesens):
+    text = f'Growth of {name} was reported.'
+    annotations = annotate(text, casesens)
+    assert [a['text'] for a in annotations] == [name]
+    location = annotations[0]['locations']
+    # Same invariant as the per-word path: the annotation covers exactly its text in the passage
+    assert location['offset'] == text.index(name)
+    assert text[location['offset']:location['offset'] + location['length']] == name
+
+@pytest.mark.parametrize('text', ['Growth of (Lactobacillus sp. ABC) was reported.', 'Growth of Lactobacillus sp. ABC, as reported.'])
+def test_trie_match_leaves_out_surrounding_punctuation(text):
+    annotations = annotate(text)
+    assert [a['text'] for a in annotations] == ['Lactobacillus sp. ABC']
+    assert annotations[0]['locations'] == {'offset': text.index('Lactobacillus'), 'length': len('Lactobacillus sp. ABC')}
+
+def test_trie_match_keeps_ambiguous_taxids():
+    annotations = annotate('Isolates of Bacillus cereus str. X1 were sequenced.')
+    assert [a['text'] for a in annotations] == ['Bacillus cereus str. X1']
+    assert annotations[0]['infons']['identifier'] == ['NCBI:txid7001', 'NCBI:txid7002']
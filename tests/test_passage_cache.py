@@ -0,0 +1,32 @@
+from microbELP.passage_cache import PassageCache
+
+def fill(cache, start, stop):
+    for k in range(start, stop):
+        cache.put(str(k), [{'text': f'taxon {k}'}])
+
+def test_size_bound_holds_after_each_flush(tmp_path):
+    path = str(tmp_path / 'passages.sqlite')
+    cache = PassageCache(path, max_entries = 10)
+    fill(cache, 0, 500)
+    cache.flush()
+    assert len(cache) == 10
+    fill(cache, 500, 3500)
+    cache.close()
+    cache = PassageCache(path, max_entries = 10)
+    assert len(cache) == 10
+    # The entries kept are the last ones stored
+    assert [cache.get(str(k)) is not None for k in (3489, 3490, 3499)] == [False, True, True]
+    cache.close()
+
+def test_recently_read_entries_are_kept(tmp_path):
+    path = str(tmp_path / 'passages.sqlite')
+    cache = PassageCache(path, max_entries = 10)
+    fill(cache, 0, 10)
+    cache.flush()
+    assert cache.get('0') == [{'text': 'taxon 0'}]
+    fill(cache, 10, 19)
+    cache.close()
+    cache = PassageCache(path, max_entries = 10)
+    assert cache.get('0') is not None
+    assert cache.get('1') is None
+    cache.close()